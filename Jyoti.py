@@ -14,84 +14,19 @@ Original file is located at
 !python -m spacy download en_core_web_sm
 
 # Cell 2: Data Collection
-import requests
-import json
-import pandas as pd
-import time
-import os
-import spacy
-
-# --- All your functions (fetch_articles, extract_entities) go here ---
-API_URL = "https://zfgp45ih7i.execute-api.eu-west-1.amazonaws.com/sandbox/api/search"
-API_KEY = "RST38746G38B7RB46GBER" # Use your actual API key
-
-def fetch_articles(query_text):
-    headers = {"Content-Type": "application/json", "x-api-key": API_KEY}
-    payload = {"query_text": query_text, "result_size": 100, "include_highlights": True}
-    try:
-        response = requests.post(API_URL, headers=headers, data=json.dumps(payload))
-        response.raise_for_status()
-        return response.json().get('results', [])
-    except requests.exceptions.RequestException as e:
-        print(f"API request failed: {e}")
-        return []
-
-nlp = spacy.load("en_core_web_sm")
-def extract_entities(text):
-    if not isinstance(text, str) or not text.strip():
-        return {'people': [], 'organizations': []}
-    doc = nlp(text)
-    people = list(set([ent.text for ent in doc.ents if ent.label_ == 'PERSON']))
-    organizations = list(set([ent.text for ent in doc.ents if ent.label_ == 'ORG']))
-    return {'people': people, 'organizations': organizations}
-
-# --- Main data collection loop ---
-DATA_FILE = 'articles.csv'
-QUERY = "AI regulation"
-
-if os.path.exists(DATA_FILE):
-    os.remove(DATA_FILE) # Start fresh every time
-
-df = pd.DataFrame()
-processed_ids = set()
-print(f"Starting data collection for 5 minutes...")
-
-# Run for 5 minutes (300 seconds) then stop
-end_time = time.time() + 300
-while time.time() < end_time:
-    articles = fetch_articles(QUERY)
-    new_articles = []
-    for article in articles:
-        article_id = str(article.get('id'))
-        if article_id not in processed_ids:
-            new_articles.append(article)
-            processed_ids.add(article_id)
-
-    if new_articles:
-        print(f"Found {len(new_articles)} new articles. Analyzing...")
-        enriched_articles = []
-        for article in new_articles:
-            entities = extract_entities(article.get('summary', ''))
-            article['people'] = entities['people']
-            article['organizations'] = entities['organizations']
-            enriched_articles.append(article)
-        new_df = pd.DataFrame(enriched_articles)
-        df = pd.concat([df, new_df], ignore_index=True)
-        df.to_csv(DATA_FILE, index=False)
-        print(f"Success. Total articles collected: {len(df)}")
-    else:
-        print("No new articles found.")
-
-    time.sleep(60) # Check for new articles every minute
+# Run the collector for 5 minutes (300 seconds) then stop. New articles are enriched and appended
+# to the Parquet dataset, and the article store remembers the ids already seen across restarts.
+!python collector.py "AI regulation" --interval 60 --result-size 100 --duration 300
 
-print("Data collection complete. articles.csv is ready.")
+print("Data collection complete. The enriched dataset is ready.")
 
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-import ast
 import nltk
-from nltk.sentiment.vader import SentimentIntensityAnalyzer
+import dataset
+from store import normalise_query
+from sentiment import score_texts
 
 # --- SETUP (Do this once at the start) ---
 
@@ -106,9 +41,8 @@ except LookupError:
     st.info("First-time setup: Downloading sentiment analysis model...")
     nltk.download('vader_lexicon')
 
-# Create a single, reusable instance of the sentiment analyzer
-sia = SentimentIntensityAnalyzer()
-DATA_FILE = 'articles.csv'
+QUERY = normalise_query("AI regulation") # Collected queries are stored normalised
+DISPLAY_COLUMNS = ['timestamp', 'summary', 'people', 'organizations', 'url']
 
 
 # --- DATA LOADING AND PROCESSING ---
@@ -119,28 +53,18 @@ DATA_FILE = 'articles.csv'
 @st.cache_data
 def load_data():
     """
-    Loads, cleans, and processes the article data from the CSV file.
+    Loads the enriched article dataset written by collector.py, reading only the columns the dashboard uses.
     """
-    try:
-        df = pd.read_csv(DATA_FILE)
-    except FileNotFoundError:
-        return pd.DataFrame() # Return an empty dataframe if file doesn't exist
+    df = dataset.read_enriched_articles(columns=DISPLAY_COLUMNS, query_text=QUERY)
+    if df.empty:
+        return df # Return the empty dataframe if nothing has been collected yet
 
-    # 1. Clean Timestamps: Convert to datetime objects, set a universal timezone (UTC),
-    #    and remove any rows that have bad timestamp data.
-    df['timestamp'] = pd.to_datetime(df['timestamp'], format='mixed', errors='coerce', utc=True)
-    df.dropna(subset=['timestamp'], inplace=True)
-
-    # 2. Add Sentiment Column: Ensure summary is a string, then calculate the sentiment score.
+    # 1. Timestamps are stored as UTC datetimes and entity lists as native list columns,
+    #    so only the sentiment score needs computing.
     df['summary'] = df['summary'].astype(str).fillna('') # Handle potential non-string data
-    df['sentiment'] = df['summary'].apply(lambda s: sia.polarity_scores(s)['compound'])
-
-    # 3. Clean Entity Lists: Convert the string representation of lists back into actual lists.
-    for col in ['people', 'organizations']:
-        if col in df.columns:
-            df[col] = df[col].apply(lambda x: ast.literal_eval(x) if isinstance(x, str) and x.startswith('[') else [])
+    df['sentiment'] = score_texts(df['summary']) # Distinct summaries are scored once and remembered across loads
 
-    return df.sort_values(by='timestamp', ascending=False)
+    return df
 
 # --- MAIN APP LOGIC ---
 
@@ -149,7 +73,7 @@ df = load_data()
 
 # Only show the dashboard if data was successfully loaded
 if df.empty:
-    st.error("Data file not found or is empty. Please run the data collection cell first.")
+    st.error("No articles have been collected yet. Please run the data collection cell first.")
 else:
     st.success(f"Successfully loaded and processed {len(df)} articles!")
 
@@ -0,0 +1,168 @@
+from contextlib import closing
+from datetime import timedelta
+
+import pandas as pd
+
+import store
+
+# Bucket sizes used by the Sentiment Trend & Momentum chart
+BUCKET_SIZES = [timedelta(hours=1), timedelta(hours=12), timedelta(days=2)]
+
+
+def update_aggregates(query_text, dataframe: pd.DataFrame, path=None):
+    """
+    Adds stored articles to the per-query sentiment sums and counts for every bucket size.
+
+    Articles are marked as aggregated in the store, so each one is only ever counted once; articles
+    not yet stored for the query, or already aggregated, are skipped.
+
+    Inputs:
+    - query_text (str): The query the articles were collected for.
+    - dataframe (pd.DataFrame): Enriched articles with 'id', 'timestamp' and 'sentiment' columns.
+    - path (str): Path to the SQLite database file. Defaults to store.STORE_PATH.
+
+    Returns:
+    - int: The number of bucket rows updated.
+    """
+
+    if dataframe.empty:
+        return 0
+
+    ids = [store.normalise_id(article_id) for article_id in dataframe['id']]
+
+    with closing(store.connect(path)) as connection, connection:
+        # Taking the write lock first stops two collectors adding the same articles
+        connection.execute("BEGIN IMMEDIATE")
+
+        pending = set()
+        for start in range(0, len(ids), store.MAX_QUERY_PARAMETERS):
+            chunk = [article_id for article_id in ids[start:start + store.MAX_QUERY_PARAMETERS] if article_id is not None]
+            placeholders = ", ".join("?" * len(chunk))
+            pending.update(article_id for (article_id,) in connection.execute(
+                f"SELECT id FROM query_articles WHERE query_text = ? AND aggregated = 0 AND id IN ({placeholders})",
+                [query_text, *chunk],
+            ))
+
+        dataframe = dataframe[[article_id in pending for article_id in ids]]
+        if dataframe.empty:
+            return 0
+
+        rows = _bucket_rows(query_text, dataframe)
+        connection.executemany(
+            "INSERT INTO sentiment_buckets (query_text, bucket_seconds, bucket_start, sentiment_sum, article_count) "
+            "VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(query_text, bucket_seconds, bucket_start) DO UPDATE SET "
+            "sentiment_sum = sentiment_sum + excluded.sentiment_sum, article_count = article_count + excluded.article_count",
+            rows,
+        )
+        connection.executemany(
+            "UPDATE query_articles SET aggregated = 1 WHERE query_text = ? AND id = ?",
+            [(query_text, article_id) for article_id in pending],
+        )
+
+    return len(rows)
+
+
+def _bucket_rows(query_text, dataframe: pd.DataFrame):
+    """
+    Sums the sentiment and counts the articles in each bucket of every bucket size.
+    """
+
+    # Buckets are aligned to the Unix epoch so increments from different batches line up
+    epoch_seconds = pd.to_datetime(dataframe['timestamp'], utc=True).astype('datetime64[s, UTC]').astype('int64')
+
+    rows = []
+    for bucket_size in BUCKET_SIZES:
+        bucket_seconds = int(bucket_size.total_seconds())
+        grouped = dataframe['sentiment'].groupby((epoch_seconds // bucket_seconds * bucket_seconds).to_numpy()).agg(['sum', 'count'])
+        rows.extend((query_text, bucket_seconds, int(start), float(total), int(count)) for start, total, count in grouped.itertuples())
+
+    return rows
+
+
+def load_sentiment_trend(query_text, bucket_size, start_date=None, path=None):
+    """
+    Loads the average sentiment per time bucket for a query from the pre-computed aggregates.
+
+    Inputs:
+    - query_text (str): The query to load.
+    - bucket_size (timedelta): One of BUCKET_SIZES.
+    - start_date (datetime): Only load buckets containing times on or after this, if given.
+    - path (str): Path to the SQLite database file. Defaults to store.STORE_PATH.
+
+    Returns:
+    - pd.Series: The average sentiment indexed by UTC bucket start, oldest first. Empty if nothing has been aggregated.
+    """
+
+    bucket_seconds = int(bucket_size.total_seconds())
+    start_seconds = 0
+    if start_date is not None:
+        start_date = pd.Timestamp(start_date)
+        start_date = start_date.tz_localize('UTC') if start_date.tzinfo is None else start_date
+        start_seconds = int(start_date.timestamp()) // bucket_seconds * bucket_seconds
+
+    with closing(store.connect(path)) as connection:
+        rows = connection.execute(
+            "SELECT bucket_start, sentiment_sum / article_count FROM sentiment_buckets "
+            "WHERE query_text = ? AND bucket_seconds = ? AND bucket_start >= ? ORDER BY bucket_start",
+            (query_text, bucket_seconds, start_seconds),
+        ).fetchall()
+
+    if not rows:
+        return pd.Series(dtype=float)
+
+    starts, averages = zip(*rows)
+    return pd.Series(averages, index=pd.to_datetime(starts, unit='s', utc=True), name='sentiment')
+
+
+def resample_sentiment(dataframe: pd.DataFrame, bucket_size):
+    """
+    Averages the sentiment of loaded articles per time bucket, the same way as the pre-computed aggregates:
+    buckets are aligned to the Unix epoch and every syndicated copy of a story counts as an article.
+
+    Inputs:
+    - dataframe (pd.DataFrame): Enriched articles with 'timestamp' and 'sentiment' columns, and a 'copies'
+      column if duplicates have been collapsed.
+    - bucket_size (timedelta): The bucket width.
+
+    Returns:
+    - pd.Series: The average sentiment indexed by UTC bucket start, oldest first, skipping empty buckets.
+    """
+
+    copies = dataframe['copies'] if 'copies' in dataframe.columns else pd.Series(1, index=dataframe.index)
+    weighted = pd.DataFrame({
+        'sentiment_sum': (dataframe['sentiment'] * copies).to_numpy(),
+        'article_count': copies.to_numpy(),
+    }, index=pd.DatetimeIndex(pd.to_datetime(dataframe['timestamp'], utc=True)).rename(None))
+
+    sums = weighted.resample(bucket_size, origin='epoch').sum()
+    sums = sums[sums['article_count'] > 0]
+    return (sums['sentiment_sum'] / sums['article_count']).rename('sentiment')
+
+
+def bin_timeline(dataframe: pd.DataFrame, max_bins):
+    """
+    Bins articles by time and sentiment group so large timelines can be drawn as a few points.
+
+    Inputs:
+    - dataframe (pd.DataFrame): Enriched articles with 'timestamp', 'sentiment', 'sentiment_category'
+      and 'copies' columns.
+    - max_bins (int): The most time bins to split the articles' time span into.
+
+    Returns:
+    - tuple: A DataFrame with one row per non-empty bin and 'bin_start', 'sentiment_category', 'articles',
+      'copies' and 'sentiment' (average) columns, and the bin width as a timedelta.
+    """
+
+    timestamps = pd.to_datetime(dataframe['timestamp'], utc=True)
+
+    # Bins are whole minutes wide and aligned to the epoch, like the sentiment buckets
+    span_seconds = (timestamps.max() - timestamps.min()).total_seconds() if len(timestamps) else 0
+    bin_size = timedelta(minutes=max(1, -(-span_seconds // (60 * max_bins))))
+
+    bins = dataframe.groupby([timestamps.dt.floor(bin_size).rename('bin_start'), 'sentiment_category'], observed=True).agg(
+        articles=('sentiment', 'size'),
+        copies=('copies', 'sum'),
+        sentiment=('sentiment', 'mean'),
+    )
+    return bins.reset_index(), bin_size
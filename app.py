@@ -2,57 +2,237 @@ import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
 import pandas as pd
-from fetch import fetch_or_retrieve_cached_data, clean_articles, filter_articles_by_time
+from fetch import fetch_or_retrieve_cached_data, clean_articles, filter_articles_by_time, localise_london, LONDON_TZ
 import sentiment
 from sentiment import package_articles_with_sentiment_info
+import metrics
+import store
+from aggregates import bin_timeline, load_sentiment_trend, resample_sentiment
+from dedup import collapse_duplicates
+from entity_index import build_entity_index, encode_entities, entity_counts, entity_options, restrict_index, select_rows
 import requests
 import os 
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 import ast
 from datetime import timedelta, datetime
 
 load_dotenv()
 
-@st.cache_data
-def get_display_data(query, filter):
-    df = fetch_or_retrieve_cached_data(query, 50)
-    clean_articles(df)
-    package_articles_with_sentiment_info(df)
+# Seconds before cached data is reloaded, so articles added by collector.py show up
+DATA_REFRESH_SECONDS = 60
 
+# Articles loaded per query; large histories are best collected in the background by collector.py
+DASHBOARD_RESULT_SIZE = int(os.getenv("DASHBOARD_RESULT_SIZE", "50"))
+
+# Entity list columns, held as vocabulary codes rather than per-row lists of strings
+ENTITY_COLUMNS = ['people', 'organizations']
+
+# Columns only shown in the deep dive, loaded from the store for the selected article instead of kept in memory
+DEEP_DIVE_COLUMNS = ['highlights']
+
+TIMELINE_MAX_ARTICLES = 1000 # Articles drawn as individual bars; larger timelines are binned
+TIMELINE_MAX_BINS = 200 # Time bins a large timeline is split into
+EXPLORER_PAGE_SIZE = 50 # Articles per page of the explorer table
+
+class ArticlesUnavailable(Exception):
+    """
+    Raised when there are no stored articles for a query and the live API couldn't provide any.
+    """
+
+@st.cache_resource(ttl=DATA_REFRESH_SECONDS)
+def get_enriched_data(query_key, _query):
+    # Cached on the normalised query alone so widget reruns skip the fetch, VADER and spaCy passes, and
+    # sessions loading the same query at once wait for one load. The query as typed goes to the API.
+    # One copy is shared by every session instead of being copied into each, so it must be treated as read-only.
+    return load_enriched_data(query_key, _query)
+
+def load_enriched_data(query_key, query):
+    # The enriched frame is also shared through the store with the other app processes on this host.
+    cache_key = f"enriched:{sentiment.NER_MODE}:{DASHBOARD_RESULT_SIZE}:{query_key}"
+    df = store.get_frame(cache_key)
+    metrics.record_cache("frame_cache", hits=int(df is not None), misses=int(df is None))
+
+    if df is None:
+        df = fetch_or_retrieve_cached_data(query, DASHBOARD_RESULT_SIZE)
+
+        # Raised rather than returned so the error isn't cached and the next rerun tries again
+        if 'message' in df.columns:
+            raise ArticlesUnavailable(df['message'].iloc[0])
+
+        clean_articles(df)
+
+        # Syndicated copies are collapsed first so each story is only analysed and shown once
+        df = collapse_duplicates(df)
+        package_articles_with_sentiment_info(df)
+
+        # Row labels double as positions for the entity columns and indexes
+        df.reset_index(drop=True, inplace=True)
+        df.drop(columns=[column for column in DEEP_DIVE_COLUMNS if column in df.columns], inplace=True)
+        store.put_frame(cache_key, df, ttl=DATA_REFRESH_SECONDS)
+
+    # Built together with the frame so the row positions always line up
+    entity_columns = {column: encode_entities(df[column]) for column in ENTITY_COLUMNS}
+    entity_indexes = {column: build_entity_index(entity_columns[column]) for column in ENTITY_COLUMNS}
+    df.drop(columns=ENTITY_COLUMNS, inplace=True)
+    return df, entity_columns, entity_indexes
+
+def binned_timeline_figure(articles):
+    """
+    Draws a large timeline as one WebGL point per time bin and sentiment group, sized by article count.
+
+    Inputs:
+    - articles (pd.DataFrame): The articles to draw, with 'timestamp', 'sentiment', 'sentiment_category' and 'copies' columns.
+
+    Returns:
+    - go.Figure: The timeline figure.
+    """
+
+    bins, bin_size = bin_timeline(articles, TIMELINE_MAX_BINS)
+    sizes = 6 + 24 * (bins['articles'] / bins['articles'].max()) ** 0.5
+
+    fig = go.Figure(go.Scattergl(
+        x=bins['bin_start'].dt.tz_convert(LONDON_TZ),
+        y=bins['sentiment_category'].astype(int),
+        mode='markers',
+        marker=dict(size=sizes, color=bins['sentiment'], colorscale='RdBu_r', cmin=-1, cmax=1, showscale=True),
+        customdata=bins[['articles', 'copies']],
+        hovertemplate="%{x}<br>%{customdata[0]} articles (%{customdata[1]} copies)<br>Avg. sentiment %{marker.color:.2f}<extra></extra>",
+    ))
+
+    fig.update_yaxes(visible=False, showticklabels=False)
+    fig.update_layout(
+        title_text=f"Timeline of {len(articles)} Articles ({bin_size.total_seconds() / 60:.0f}-minute bins)",
+        height=400,
+        margin=dict(t=20, b=40)
+    )
+    return fig
+
+def get_display_data(query_key, query, filter):
+    df, entity_columns, entity_indexes = get_enriched_data(query_key, query)
+
+    # The time window changes on every rerun, so it is applied as a slice of the cached frame
     if filter:
-        return filter_articles_by_time(df, filter)
+        return filter_articles_by_time(df, filter), entity_columns, entity_indexes
     
-    return df
+    return df, entity_columns, entity_indexes
 
     ...
 
-def get_ai_summary(query, articles_text):
+# Gemini endpoint, overridable so briefings can be tested against a local stub
+GEMINI_API_URL = os.getenv("GEMINI_API_URL", "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent")
+
+BRIEFING_CHUNK_SIZE = 20 # Article summaries per Gemini request
+BRIEFING_MAX_CONCURRENCY = 4 # Chunk summaries requested at once
+BRIEFING_MAX_ARTICLES = 500 # Most recent articles included in a briefing
+
+def generate_text(prompt):
+    """
+    Sends a prompt to the Gemini API and returns the generated text.
+
+    Inputs:
+    - prompt (str): The prompt to send.
+
+    Returns:
+    - str: The generated text, or None if the model returned no content.
+    """
+
+    chatHistory = [{"role": "user", "parts": [{"text": prompt}]}]
+    payload = {"contents": chatHistory}
+    # IMPORTANT: Replace with your own key from aistudio.google.com/app/apikey
+    apiKey = os.getenv("GEMINI_API_KEY")
+
+    response = requests.post(GEMINI_API_URL, params={'key': apiKey}, headers={'Content-Type': 'application/json'}, json=payload, timeout=60)
+    response.raise_for_status()
+    result = response.json()
+
+    if (result.get('candidates') and result['candidates'][0].get('content') and result['candidates'][0]['content'].get('parts')):
+        return result['candidates'][0]['content']['parts'][0]['text']
+    return None
+
+def summarize_articles(query, summaries):
+    """
+    Summarizes article summaries in one request, or in concurrent chunks that are then merged.
+
+    Inputs:
+    - query (str): The search query the articles belong to.
+    - summaries (list of str): The article summaries to cover.
 
-    prompt = f"""
+    Returns:
+    - str: The briefing, or None if the model returned no content.
+    """
+
+    if len(summaries) <= BRIEFING_CHUNK_SIZE:
+        articles_text = "\n".join(summaries)
+        return generate_text(f"""
     Please give me a concise overall summary of the following news article summaries, staying broadly on topic.
     Preface with 'Here's a summary of the latest news articles on '{query}', or similar.
     Aim for two or three paragraphs.
     News Summaries:
     {articles_text}
+    """)
+
+    # Map: summarize each chunk of articles concurrently
+    chunks = ["\n".join(summaries[i:i + BRIEFING_CHUNK_SIZE]) for i in range(0, len(summaries), BRIEFING_CHUNK_SIZE)]
+    with ThreadPoolExecutor(max_workers=BRIEFING_MAX_CONCURRENCY) as executor:
+        partial_summaries = list(executor.map(lambda articles_text: generate_text(f"""
+    Please summarize the key points of the following news article summaries about '{query}' in one short paragraph.
+    News Summaries:
+    {articles_text}
+    """), chunks))
+
+    partial_summaries = [partial for partial in partial_summaries if partial]
+    if not partial_summaries:
+        return None
+
+    # Reduce: merge the partial summaries into a single briefing
+    partials_text = "\n\n".join(partial_summaries)
+    return generate_text(f"""
+    Please combine the following partial summaries of news coverage into one concise overall summary, staying broadly on topic.
+    Preface with 'Here's a summary of the latest news articles on '{query}', or similar.
+    Aim for two or three paragraphs.
+    Partial Summaries:
+    {partials_text}
+    """)
+
+class BriefingUnavailable(Exception):
+    """
+    Raised when the AI model returns no content for a briefing.
     """
 
-    chatHistory = [{"role": "user", "parts": [{"text": prompt}]}]
-    payload = {"contents": chatHistory}
-    # IMPORTANT: Replace with your own key from aistudio.google.com/app/apikey
-    apiKey = os.getenv("GEMINI_API_KEY")
-    apiUrl = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={apiKey}"
+@st.cache_data(show_spinner=False)
+def get_briefing(query_key, articles_key, _query, _summaries):
+    # Cached on the normalised query and a hash of the article ids; the summaries themselves aren't hashed
+    briefing = summarize_articles(_query, _summaries)
+
+    # Raised rather than returned so the failure isn't cached and the next rerun tries again
+    if briefing is None:
+        raise BriefingUnavailable("The AI model could not generate a summary based on the provided text.")
+    return briefing
+
+def get_ai_summary(query, articles: pd.DataFrame):
+    """
+    Generates an AI briefing for a set of articles, reusing an earlier briefing for the same articles.
+
+    Inputs:
+    - query (str): The search query the articles belong to.
+    - articles (pd.DataFrame): The articles to cover, with 'id' and 'summary' columns.
+
+    Returns:
+    - str: The briefing or an error message.
+    """
+
+    articles_key = hashlib.sha1("\x1f".join(sorted(articles['id'].astype(str))).encode("utf-8")).hexdigest()
 
     try:
-        response = requests.post(apiUrl, headers={'Content-Type': 'application/json'}, json=payload)
-        response.raise_for_status()
-        result = response.json()
-
-        if (result.get('candidates') and result['candidates'][0].get('content') and result['candidates'][0]['content'].get('parts')):
-            return result['candidates'][0]['content']['parts'][0]['text']
-        else:
-            return "The AI model could not generate a summary based on the provided text."
+        briefing = get_briefing(store.normalise_query(query), articles_key, query, articles['summary'].astype(str).tolist())
     except requests.exceptions.RequestException as e:
         return f"An error occurred while contacting the AI model: {e}"
+    except BriefingUnavailable as e:
+        return str(e)
+
+    return briefing
 
 
 
@@ -75,34 +255,38 @@ def init_app():
 
     delta = time_range_options[selected_range_label]
 
-    if search_bar:
-        df = get_display_data(search_bar, datetime.now() - delta if delta else None)
-    else:
-        df = get_display_data("Cake recipes", datetime.now() - delta if delta else None)
-
+    # Queries differing only in case or spacing share cached and stored results, but the API and the
+    # briefing get the query as typed
+    query = search_bar if search_bar.strip() else "Cake recipes"
+    query_key = store.normalise_query(query)
+    start_date = datetime.now() - delta if delta else None
+    try:
+        df, entity_columns, entity_indexes = get_display_data(query_key, query, start_date)
+    except ArticlesUnavailable as e:
+        st.error(str(e))
+        st.stop()
 
 
-    print(selected_range_label)
 
 
     st.sidebar.header("Filter by Entities")
 
-    print(df['people'])
-    print(df['organizations'])
-    all_people = df['people'].explode().dropna().unique().tolist()
-    all_orgs = df['organizations'].explode().dropna().unique().tolist()
-
+    # The time window is a contiguous run of row positions, so the options only cover the articles in it
+    window_start, window_stop = (int(df.index[0]), int(df.index[-1]) + 1) if not df.empty else (0, 0)
+    entity_indexes = {column: restrict_index(index, window_start, window_stop) for column, index in entity_indexes.items()}
 
+    people_counts = entity_counts(entity_indexes['people'])
+    org_counts = entity_counts(entity_indexes['organizations'])
 
-    selected_people = st.sidebar.multiselect("Select people to focus on:", all_people)
-    selected_orgs = st.sidebar.multiselect("Select organizations to focus on:", all_orgs)
+    # Options are ranked by how many articles mention them
+    selected_people = st.sidebar.multiselect("Select people to focus on:", entity_options(entity_indexes['people']), format_func=lambda p: f"{p} ({people_counts[p]})")
+    selected_orgs = st.sidebar.multiselect("Select organizations to focus on:", entity_options(entity_indexes['organizations']), format_func=lambda o: f"{o} ({org_counts[o]})")
 
-    filtered_df = df.copy()
+    filtered_df = df
 
-    if selected_people:
-        filtered_df = filtered_df[filtered_df['people'].apply(lambda people_list: any(p in people_list for p in selected_people))]
-    if selected_orgs:
-        filtered_df = filtered_df[filtered_df['organizations'].apply(lambda org_list: any(o in org_list for o in selected_orgs))]
+    selected_rows = select_rows(entity_indexes, {'people': selected_people, 'organizations': selected_orgs})
+    if selected_rows is not None:
+        filtered_df = filtered_df[filtered_df.index.isin(selected_rows)]
 
     
 
@@ -116,8 +300,7 @@ def init_app():
     st.subheader("Summary")
     if st.button("✨ Generate Briefing"):
         with st.spinner("The AI analyst is reviewing the articles..."):
-            text_to_summarize = "\n".join(filtered_df['summary'].head(20).tolist())
-            st.info(get_ai_summary(search_bar if search_bar else "Cake recipes", text_to_summarize))
+            st.info(get_ai_summary(query, filtered_df.tail(BRIEFING_MAX_ARTICLES)))
 
             #st.session_state.summary = get_ai_summary(text_to_summarize)
 
@@ -131,8 +314,6 @@ def init_app():
     # --- TWO-COLUMN LAYOUT ---
     col1, col2 = st.columns(2, gap="medium") # Using a simpler syntax and adding a gap
 
-    final_filtered_df = filtered_df.copy()
-
     with col1:
         st.subheader("Sentiment Trend & Momentum")
 
@@ -142,46 +323,65 @@ def init_app():
             "Last 30 Days": timedelta(days=2), 
             "All Time": timedelta(days=2)}
 
-        sentiment_over_time = final_filtered_df.set_index('timestamp')['sentiment'].resample(tr_options[selected_range_label]).mean().dropna()
-        sentiment_momentum = sentiment_over_time.diff().rolling(window=2).mean()
+        # Timed separately from rendering so slow aggregation shows up in the metrics
+        with metrics.timer("chart_sentiment_trend", articles=len(filtered_df)):
+            bucket_size = tr_options[selected_range_label]
+
+            # Unfiltered views of collected queries always come from the collector's pre-computed buckets, which
+            # cover every article it has stored; entity filters, and queries it doesn't track, need the loaded
+            # articles, averaged over the same epoch-aligned buckets with every syndicated copy counted
+            sentiment_over_time = pd.Series(dtype=float)
+            if not (selected_people or selected_orgs):
+                sentiment_over_time = load_sentiment_trend(query_key, bucket_size, localise_london(start_date) if start_date else None)
+            if sentiment_over_time.empty:
+                sentiment_over_time = resample_sentiment(filtered_df, bucket_size)
+
+            # Times are kept in UTC and only converted to London time for display
+            sentiment_over_time = sentiment_over_time.tz_convert(LONDON_TZ)
+            sentiment_momentum = sentiment_over_time.diff().rolling(window=2).mean()
 
-        fig_momentum = go.Figure()
-        fig_momentum.add_trace(go.Bar(x=sentiment_over_time.index, y=sentiment_over_time.values, name='Hourly Avg. Sentiment', marker_color='#add8e6'))
+            fig_momentum = go.Figure()
+            fig_momentum.add_trace(go.Bar(x=sentiment_over_time.index, y=sentiment_over_time.values, name='Hourly Avg. Sentiment', marker_color='#add8e6'))
 
 
-        fig_momentum.add_trace(go.Scatter(x=sentiment_momentum.index, y=sentiment_momentum.values, name='Sentiment Momentum', mode='lines', line=dict(color='#ff4b4b', width=3)))
+            fig_momentum.add_trace(go.Scatter(x=sentiment_momentum.index, y=sentiment_momentum.values, name='Sentiment Momentum', mode='lines', line=dict(color='#ff4b4b', width=3)))
         
 
-        fig_momentum.update_layout(
-            title_text='Is the narrative getting better or worse?',
-            yaxis_title='Sentiment Score / Momentum',
-            legend=dict(yanchor="top", y=0.99, xanchor="left", x=0.01),
-            height=400,
-            margin=dict(t=20, b=40)
-        )
+            fig_momentum.update_layout(
+                title_text='Is the narrative getting better or worse?',
+                yaxis_title='Sentiment Score / Momentum',
+                legend=dict(yanchor="top", y=0.99, xanchor="left", x=0.01),
+                height=400,
+                margin=dict(t=20, b=40)
+            )
+
         st.plotly_chart(fig_momentum, use_container_width=True)
 
     with col2:
         st.subheader("Timeline View")
-        final_filtered_df['task'] = final_filtered_df['timestamp'].dt.strftime('%Y-%m-%d %H:%M') + " - " + final_filtered_df['summary'].str[:40] + "..."
-
-        fig_timeline = px.timeline(
-            filtered_df,
-            x_start="timestamp",
-            x_end=filtered_df['timestamp'] + pd.Timedelta(minutes=120),
-            y="sentiment_category",
-            color='sentiment',          # This line will now work correctly
-            color_continuous_scale='RdBu_r', # Use a Red-to-Blue color scale
-            range_color=[-1, 1],        # Lock the color scale from -1 to 1
-            hover_name='summary'        # Show full summary on hover
-        )
-
-        fig_timeline.update_yaxes(visible=False, showticklabels=False)
-        fig_timeline.update_layout(
-            title_text=f"Timeline of {len(final_filtered_df)} Articles",
-            height=400,
-            margin=dict(t=20, b=40)
-        )
+        with metrics.timer("chart_timeline", articles=len(filtered_df)):
+            if len(filtered_df) > TIMELINE_MAX_ARTICLES:
+                fig_timeline = binned_timeline_figure(filtered_df)
+            else:
+                fig_timeline = px.timeline(
+                    filtered_df,
+                    x_start=filtered_df['timestamp'].dt.tz_convert(LONDON_TZ),
+                    x_end=filtered_df['timestamp'].dt.tz_convert(LONDON_TZ) + pd.Timedelta(minutes=120),
+                    y="sentiment_category",
+                    color='sentiment',          # This line will now work correctly
+                    color_continuous_scale='RdBu_r', # Use a Red-to-Blue color scale
+                    range_color=[-1, 1],        # Lock the color scale from -1 to 1
+                    hover_name='summary',       # Show full summary on hover
+                    hover_data={'copies': True} # Show how many outlets ran the story
+                )
+
+                fig_timeline.update_yaxes(visible=False, showticklabels=False)
+                fig_timeline.update_layout(
+                    title_text=f"Timeline of {len(filtered_df)} Articles",
+                    height=400,
+                    margin=dict(t=20, b=40)
+                )
+
         st.plotly_chart(fig_timeline, use_container_width=True)
 
     st.divider()
@@ -190,16 +390,29 @@ def init_app():
     st.subheader("Article Explorer")
     st.info("Click on any row in the table below to see a detailed deep dive.")
 
+    # Only one page of articles is sent to the browser at a time
+    page_count = max(1, -(-len(filtered_df) // EXPLORER_PAGE_SIZE))
+    page = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, value=1, step=1) if page_count > 1 else 1
+    page_df = filtered_df.iloc[(page - 1) * EXPLORER_PAGE_SIZE:page * EXPLORER_PAGE_SIZE]
+
     # Using st.dataframe with on_select for a cleaner, read-only interactive table
+    # Entity names are only decoded for the rows being shown
+    explorer_df = page_df[['timestamp', 'summary', 'copies', 'url']].assign(
+        people=entity_columns['people'].rows(page_df.index),
+        organizations=entity_columns['organizations'].rows(page_df.index),
+    )
+
     selection = st.dataframe(
-        filtered_df[['timestamp', 'summary', 'people', 'organizations', 'url']],
+        explorer_df,
+        column_order=['timestamp', 'summary', 'copies', 'people', 'organizations', 'url'],
         on_select="rerun",
         selection_mode="single-row",
-        key="article_selector_df",
+        key=f"article_selector_df_{page}", # A new key per page so a selection doesn't carry over to another page
         hide_index=True,
         column_config={
             "timestamp": st.column_config.DatetimeColumn("Time (UTC)", format="D MMM, h:mmA"),
             "summary": "Article Summary",
+            "copies": st.column_config.NumberColumn("Copies", help="Near-identical articles grouped into this story"),
             
             "people": "People",
             "organizations": "Organizations",
@@ -215,7 +428,7 @@ def init_app():
         try:
             selected_index = selection["selection"]["rows"][0]
 
-            article_details = filtered_df.iloc[selected_index]
+            article_details = page_df.iloc[selected_index]
 
 
             with st.expander("Deep Dive: Selected Article", expanded=True):
@@ -223,11 +436,18 @@ def init_app():
                 #st.markdown(f"**Sentiment Score:** {article_details['sentiment']:.2f}")
 
 
-                if 'highlights' in article_details and article_details['highlights']:
+                # Highlights aren't kept in the shared frame, so they are loaded for this article only
+                stored_article = store.get_article(article_details['id']) or {}
+                highlights = stored_article.get('highlights')
+
+                # Highlights are native lists, except in rows cached before the Parquet/JSON stores
+                if isinstance(highlights, str):
+                    highlights = ast.literal_eval(highlights)
+
+                if highlights is not None and len(highlights):
                     st.markdown("**Key Highlights:**")
-                    l = ast.literal_eval(str(article_details['highlights']))
                 
-                    for highlight in l:
+                    for highlight in highlights:
                         st.markdown(f"- *{highlight}*")
 
                 st.markdown(f"**Source URL:** [Link]({article_details['url']})")
@@ -236,4 +456,11 @@ def init_app():
             st.warning("Please re-select a row from the current view to see details.")
 
 if __name__ == "__main__":
-    init_app()
\ No newline at end of file
+
+    # Expose the pipeline metrics for Prometheus when a port is configured
+    if os.getenv("METRICS_PORT"):
+        metrics.start_metrics_server(int(os.getenv("METRICS_PORT")))
+
+    # Opening the app with ?profile=1 profiles that single request with cProfile
+    with metrics.profile(enabled=st.query_params.get("profile") == "1", output_path=os.getenv("PROFILE_OUTPUT_PATH")):
+        init_app()
\ No newline at end of file
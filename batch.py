@@ -0,0 +1,182 @@
+import argparse
+import re
+import time
+
+import pandas as pd
+
+import aggregates
+import dataset
+import dedup
+import metrics
+import store
+from fetch import fetch_many, clean_articles, filter_articles_by_time, DEFAULT_MAX_CONCURRENCY
+from sentiment import package_articles_with_sentiment_info, DEFAULT_BATCH_SIZE, DEFAULT_N_PROCESS, NER_MODE, NER_MODES
+
+# --- Configuration ---
+DEFAULT_RESULT_SIZE = 100
+BATCH_STAGES = ["fetch", "clean", "enrich", "write"]
+ENRICHMENT_COLUMNS = ['sentiment', 'sentiment_category', 'people', 'organizations']
+SINCE_UNITS = {'m': 'minutes', 'h': 'hours', 'd': 'days', 'w': 'weeks'}
+
+_DURATION_PATTERN = re.compile(r"^(\d+)([mhdw])$")
+
+
+def parse_since(value):
+    """
+    Parses the --since option, either a duration back from now (e.g. '30m', '6h', '2d', '1w') or a timestamp.
+
+    Inputs:
+    - value (str): The option value. Timestamps without an offset are taken as UTC.
+
+    Returns:
+    - pd.Timestamp: The UTC start of the window to process.
+    """
+
+    duration = _DURATION_PATTERN.match(value.strip().lower())
+    if duration:
+        amount, unit = duration.groups()
+        return pd.Timestamp.now(tz='UTC') - pd.Timedelta(**{SINCE_UNITS[unit]: int(amount)})
+
+    since = pd.Timestamp(value)
+    return since.tz_localize('UTC') if since.tzinfo is None else since.tz_convert('UTC')
+
+
+def read_queries(queries, queries_file=None):
+    """
+    Combines queries given on the command line with those listed in a file, one per line.
+
+    Inputs:
+    - queries (list of str): Queries from the command line.
+    - queries_file (str): Path to a file of queries, or None. Blank lines and lines starting with '#' are skipped.
+
+    Returns:
+    - list: The distinct queries, in the first form given, in order. Queries differing only in case or
+      whitespace share stored results, so they are only processed once.
+    """
+
+    queries = list(queries)
+    if queries_file:
+        with open(queries_file) as file:
+            queries.extend(line.strip() for line in file if line.strip() and not line.startswith('#'))
+
+    return store.distinct_queries(queries)
+
+
+def run_batch(queries, result_size=DEFAULT_RESULT_SIZE, since=None, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+              n_process=DEFAULT_N_PROCESS, batch_size=DEFAULT_BATCH_SIZE, ner_mode=None):
+    """
+    Fetches and enriches every query, then writes the results for the dashboard to load.
+
+    Inputs:
+    - queries (list of str): The queries to process, as sent to the API. Results are stored under
+      store.normalise_query(query_text).
+    - result_size (int): The number of results to request per query.
+    - since (pd.Timestamp): Only process articles published at or after this time, if given.
+    - max_concurrency (int): The maximum number of API calls in flight at once.
+    - n_process (int): The number of worker processes for entity extraction (-1 for all cores).
+    - batch_size (int): The number of summaries spaCy processes per batch.
+    - ner_mode (str): The entity extraction mode, one of sentiment.NER_MODES. Defaults to sentiment.NER_MODE.
+
+    Returns:
+    - dict: The number of new articles written per query.
+    """
+
+    # fetch: every query concurrently over the shared session
+    start = time.perf_counter()
+    results = fetch_many([(query_text, result_size) for query_text in queries], max_concurrency=max_concurrency)
+    fetched = sum(len(df) for df in results if 'message' not in df.columns)
+    metrics.record_stage("batch_fetch", time.perf_counter() - start, fetched)
+
+    # clean: keep only articles in the window that this query hasn't already aggregated
+    new_frames = {}
+    with metrics.timer("batch_clean", articles=fetched):
+        for query_text, df in zip(queries, results):
+            if 'message' in df.columns:
+                print(f"[{query_text}] {df['message'].iloc[0]}")
+                continue
+            if df.empty or 'id' not in df.columns:
+                continue
+
+            ids = [store.normalise_id(article_id) for article_id in df['id']]
+            seen = store.known_ids(store.normalise_query(query_text), [article_id for article_id in ids if article_id is not None], aggregated=True)
+            new_df = df[[article_id is not None and article_id not in seen for article_id in ids]].copy()
+
+            clean_articles(new_df)
+            if since is not None and not new_df.empty:
+                new_df = filter_articles_by_time(new_df, since)
+
+            if not new_df.empty:
+                new_frames[query_text] = new_df
+
+    if not new_frames:
+        return {query_text: 0 for query_text in queries}
+
+    # enrich: articles returned for several queries, and syndicated copies of the same story, are analysed once
+    unique_df = pd.concat(new_frames.values(), ignore_index=True).drop_duplicates(subset='id', ignore_index=True)
+    with metrics.timer("batch_enrich", articles=len(unique_df)):
+        dedup.enrich_stories(unique_df, lambda stories: package_articles_with_sentiment_info(stories, batch_size=batch_size, n_process=n_process, ner_mode=ner_mode))
+    enrichments = unique_df.set_index('id')[ENRICHMENT_COLUMNS]
+
+    # write: the article store, the sentiment trend aggregates and the Parquet dataset
+    written = {query_text: 0 for query_text in queries}
+    with metrics.timer("batch_write", articles=sum(len(df) for df in new_frames.values())):
+        for query_text, new_df in new_frames.items():
+            enriched_df = new_df.join(enrichments, on='id')
+            query_key = store.normalise_query(query_text)
+            enriched_df['query_text'] = query_key
+
+            store.upsert_articles(query_key, enriched_df)
+            aggregates.update_aggregates(query_key, enriched_df)
+            written[query_text] = dataset.write_enriched_articles(enriched_df)
+
+    return written
+
+
+def print_throughput():
+    """
+    Prints the time taken and articles per second for each batch stage.
+    """
+
+    stages = metrics.snapshot()['stages']
+
+    print(f"{'stage':<8} {'articles':>9} {'seconds':>9} {'articles/s':>12}")
+    for stage in BATCH_STAGES:
+        totals = stages.get(f"batch_{stage}")
+        if totals is None:
+            continue
+
+        rate = totals['articles'] / totals['seconds'] if totals['seconds'] > 0 else float('inf')
+        print(f"{stage:<8} {totals['articles']:>9} {totals['seconds']:>9.2f} {rate:>12.0f}")
+
+
+# --- Main execution block for headless batch runs ---
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Fetch and enrich queries in bulk, writing datasets and aggregates for the dashboard.")
+    parser.add_argument("queries", nargs="*", help="Queries to process.")
+    parser.add_argument("--queries-file", help="File listing queries to process, one per line.")
+    parser.add_argument("--result-size", type=int, default=DEFAULT_RESULT_SIZE, help="Number of results to request per query.")
+    parser.add_argument("--since", type=parse_since, default=None, help="Only process articles since a duration ago (e.g. 6h, 2d) or a timestamp (UTC if no offset).")
+    parser.add_argument("--max-concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY, help="Maximum number of API calls in flight at once.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_N_PROCESS, help="Worker processes for entity extraction (-1 for all cores).")
+    parser.add_argument("--ner-batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Batch size for spaCy's nlp.pipe.")
+    parser.add_argument("--ner-mode", choices=NER_MODES, default=NER_MODE, help="Entity extraction mode, trading accuracy for throughput.")
+    args = parser.parse_args()
+
+    queries = read_queries(args.queries, args.queries_file)
+    if not queries:
+        parser.error("no queries given; pass them as arguments or with --queries-file")
+
+    written = run_batch(
+        queries,
+        result_size=args.result_size,
+        since=args.since,
+        max_concurrency=args.max_concurrency,
+        n_process=args.workers,
+        batch_size=args.ner_batch_size,
+        ner_mode=args.ner_mode,
+    )
+
+    for query_text, count in written.items():
+        print(f"[{query_text}] Wrote {count} new articles.")
+    print_throughput()
@@ -0,0 +1,177 @@
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import aggregates
+import dedup
+import fetch
+import mock_api
+import sentiment
+
+# --- Configuration ---
+DEFAULT_SIZES = [100, 10_000, 100_000]
+DEFAULT_REPEATS = 5
+STAGES = ["fetch", "clean", "dedup", "sentiment", "ner", "filter", "resample"]
+
+
+def time_stage(run, make_input, repeats):
+    """
+    Times a pipeline stage over several runs, preparing a fresh input for each one.
+
+    Inputs:
+    - run (callable): The stage, called with the prepared input.
+    - make_input (callable): Builds the input for one run. Its cost isn't timed.
+    - repeats (int): The number of timed runs.
+
+    Returns:
+    - list: The duration of each run in seconds.
+    """
+
+    durations = []
+    for _ in range(repeats):
+        stage_input = make_input()
+        start = time.perf_counter()
+        run(stage_input)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def summarise(stage, size, durations):
+    """
+    Reduces a stage's run durations to throughput and latency percentiles.
+
+    Inputs:
+    - stage (str): The stage name.
+    - size (int): The number of articles per run.
+    - durations (list): The duration of each run in seconds.
+
+    Returns:
+    - dict: A dictionary with 'stage', 'articles', 'runs', 'p50_ms', 'p95_ms' and 'articles_per_s' keys.
+    """
+
+    p50, p95 = np.percentile(durations, [50, 95])
+    return {
+        'stage': stage,
+        'articles': size,
+        'runs': len(durations),
+        'p50_ms': p50 * 1000,
+        'p95_ms': p95 * 1000,
+        'articles_per_s': size / p50 if p50 > 0 else float('inf'),
+    }
+
+
+def benchmark_size(size, repeats, stages, ner_batch_size, ner_processes, ner_mode=None):
+    """
+    Runs every selected stage of the pipeline over a synthetic result set of the given size.
+
+    Inputs:
+    - size (int): The number of articles to request from the mock API.
+    - repeats (int): The number of timed runs per stage.
+    - stages (list of str): The stages to time.
+    - ner_batch_size (int): The batch size for spaCy's nlp.pipe.
+    - ner_processes (int): The number of worker processes for entity extraction.
+    - ner_mode (str): The entity extraction mode, one of sentiment.NER_MODES. Defaults to sentiment.NER_MODE.
+
+    Returns:
+    - list: One summary dictionary per stage.
+    """
+
+    results = []
+
+    # fetch: one API round trip plus JSON parsing and normalisation
+    if "fetch" in stages:
+        results.append(summarise("fetch", size, time_stage(lambda _: fetch.fetch_and_process_data("benchmark", size), lambda: None, repeats)))
+
+    raw_df = fetch.fetch_and_process_data("benchmark", size)
+    if 'message' in raw_df.columns:
+        raise RuntimeError(raw_df['message'].iloc[0])
+
+    if "clean" in stages:
+        results.append(summarise("clean", size, time_stage(fetch.clean_articles, raw_df.copy, repeats)))
+
+    cleaned_df = raw_df.copy()
+    fetch.clean_articles(cleaned_df)
+
+    if "dedup" in stages:
+        results.append(summarise("dedup", size, time_stage(dedup.collapse_duplicates, lambda: cleaned_df, repeats)))
+
+    # The mock API returns the same articles every run, so memoised scores and learned names are
+    # forgotten before each one; otherwise every run after the first only times cache lookups
+    if "sentiment" in stages:
+        def sentiment_input():
+            sentiment.compound_score.cache_clear()
+            return cleaned_df.copy()
+
+        results.append(summarise("sentiment", size, time_stage(sentiment.analyze_sentiment, sentiment_input, repeats)))
+
+    if "ner" in stages:
+        summaries = cleaned_df['summary'].tolist()
+
+        def ner_input():
+            sentiment.reset_gazetteer()
+            if (ner_mode or sentiment.NER_MODE) != 'accurate':
+                sentiment.get_gazetteer()
+            return summaries
+
+        results.append(summarise("ner", size, time_stage(
+            lambda texts: sentiment.extract_entities_batch(texts, batch_size=ner_batch_size, n_process=ner_processes, mode=ner_mode),
+            ner_input,
+            repeats,
+        )))
+
+    scored_df = cleaned_df.copy()
+    sentiment.analyze_sentiment(scored_df)
+    start_date = datetime.now() - timedelta(days=7)
+
+    if "filter" in stages:
+        results.append(summarise("filter", size, time_stage(lambda df: fetch.filter_articles_by_time(df, start_date), scored_df.copy, repeats)))
+
+    # resample: the Sentiment Trend & Momentum aggregation from app.init_app
+    if "resample" in stages:
+        def resample(df):
+            sentiment_over_time = aggregates.resample_sentiment(df, timedelta(hours=1))
+            sentiment_over_time.diff().rolling(window=2).mean()
+
+        results.append(summarise("resample", size, time_stage(resample, scored_df.copy, repeats)))
+
+    return results
+
+
+def print_report(results):
+    """
+    Prints benchmark results as a table.
+    """
+
+    print(f"{'stage':<10} {'articles':>9} {'runs':>5} {'p50 ms':>10} {'p95 ms':>10} {'articles/s':>12}")
+    for result in results:
+        print(
+            f"{result['stage']:<10} {result['articles']:>9} {result['runs']:>5} "
+            f"{result['p50_ms']:>10.1f} {result['p95_ms']:>10.1f} {result['articles_per_s']:>12.0f}"
+        )
+
+
+# --- Main execution block for running the benchmarks ---
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Benchmark the article pipeline against a local mock of the search API.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Result sizes to benchmark.")
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS, help="Timed runs per stage.")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES, help="Stages to time.")
+    parser.add_argument("--latency", type=float, default=mock_api.DEFAULT_LATENCY, help="Seconds the mock API waits before answering.")
+    parser.add_argument("--ner-batch-size", type=int, default=sentiment.DEFAULT_BATCH_SIZE, help="Batch size for spaCy's nlp.pipe.")
+    parser.add_argument("--ner-processes", type=int, default=sentiment.DEFAULT_N_PROCESS, help="Worker processes for entity extraction.")
+    parser.add_argument("--ner-mode", choices=sentiment.NER_MODES, default=sentiment.NER_MODE, help="Entity extraction mode, trading accuracy for throughput.")
+    args = parser.parse_args()
+
+    # Point the fetch layer at a mock API on a free local port
+    server = mock_api.start_server(port=0, latency=args.latency, seed=0)
+    fetch.API_URL = f"http://{mock_api.DEFAULT_HOST}:{server.server_port}/"
+
+    results = []
+    for size in args.sizes:
+        results.extend(benchmark_size(size, args.repeats, args.stages, args.ner_batch_size, args.ner_processes, args.ner_mode))
+
+    server.shutdown()
+    print_report(results)
@@ -0,0 +1,187 @@
+import argparse
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import aggregates
+import dataset
+import dedup
+import sentiment
+import store
+from fetch import iter_fetch_and_process_data, clean_articles, ensure_pool_size, DEFAULT_CHUNK_SIZE, DEFAULT_MAX_CONCURRENCY
+from sentiment import package_articles_with_sentiment_info
+
+# --- Configuration ---
+DEFAULT_INTERVAL = 60 # Seconds between fetches of each query
+DEFAULT_RESULT_SIZE = 100
+DEFAULT_JITTER = 0.2 # Fraction of the delay to randomly add or remove
+DEFAULT_MAX_BACKOFF = 900 # Longest wait in seconds after repeated failures
+
+
+def next_delay(interval, failures, jitter=DEFAULT_JITTER, max_backoff=DEFAULT_MAX_BACKOFF):
+    """
+    Works out how long to wait before fetching a query again.
+
+    Inputs:
+    - interval (float): The normal number of seconds between fetches.
+    - failures (int): The number of consecutive failed fetches for the query.
+    - jitter (float): Fraction of the delay to randomly add or remove, so queries don't fire in lockstep.
+    - max_backoff (float): The longest delay in seconds.
+
+    Returns:
+    - float: The delay in seconds.
+    """
+
+    # Back off exponentially while the query keeps failing
+    delay = min(interval * (2 ** failures), max_backoff)
+    return delay * random.uniform(1 - jitter, 1 + jitter)
+
+
+def collect_query(query_text, dataframe, ner_mode=None):
+    """
+    Enriches and stores the articles for a query that haven't been collected before.
+
+    Inputs:
+    - query_text (str): The query the articles were retrieved for. They are stored under store.normalise_query(query_text).
+    - dataframe (pd.DataFrame): The articles returned by the API.
+    - ner_mode (str): The entity extraction mode, one of sentiment.NER_MODES. Defaults to sentiment.NER_MODE.
+
+    Returns:
+    - int: The number of new articles stored.
+    """
+
+    if dataframe.empty or 'id' not in dataframe.columns:
+        return 0
+
+    # The store records which ids each query has already aggregated, so this survives restarts and
+    # still picks up articles the dashboard stored without aggregating
+    query_key = store.normalise_query(query_text)
+    ids = [store.normalise_id(article_id) for article_id in dataframe['id']]
+    seen = store.known_ids(query_key, [article_id for article_id in ids if article_id is not None], aggregated=True)
+    new_df = dataframe[[article_id is not None and article_id not in seen for article_id in ids]].copy()
+
+    if new_df.empty:
+        return 0
+
+    # Only the new articles are cleaned and enriched before being appended to the store; syndicated
+    # copies are analysed once and share their story's enrichment
+    clean_articles(new_df)
+    dedup.enrich_stories(new_df, lambda stories: package_articles_with_sentiment_info(stories, ner_mode=ner_mode))
+    new_df['query_text'] = query_key
+    store.upsert_articles(query_key, new_df)
+
+    # Roll the new articles into the pre-computed sentiment trend buckets
+    aggregates.update_aggregates(query_key, new_df)
+
+    # The enriched articles also go to the Parquet dataset the dashboards load from
+    return dataset.write_enriched_articles(new_df)
+
+
+def collect_stream(query_text, result_size, chunk_size=DEFAULT_CHUNK_SIZE, ner_mode=None):
+    """
+    Streams a query's results from the API and stores the new articles chunk by chunk.
+
+    Inputs:
+    - query_text (str): The query to fetch, as typed.
+    - result_size (int): The number of results to request.
+    - chunk_size (int): The number of articles parsed, enriched and stored at a time.
+    - ner_mode (str): The entity extraction mode, one of sentiment.NER_MODES. Defaults to sentiment.NER_MODE.
+
+    Returns:
+    - tuple: The number of new articles stored, and the error message if the request failed (else None).
+    """
+
+    new_count = 0
+    for chunk in iter_fetch_and_process_data(query_text, result_size, chunk_size=chunk_size):
+        if 'message' in chunk.columns:
+            return new_count, chunk['message'].iloc[0]
+
+        new_count += collect_query(query_text, chunk, ner_mode)
+
+    return new_count, None
+
+
+def run_collector(queries, interval=DEFAULT_INTERVAL, result_size=DEFAULT_RESULT_SIZE, jitter=DEFAULT_JITTER,
+                  max_backoff=DEFAULT_MAX_BACKOFF, max_concurrency=DEFAULT_MAX_CONCURRENCY, duration=None,
+                  chunk_size=DEFAULT_CHUNK_SIZE, ner_mode=None):
+    """
+    Repeatedly fetches each query on its own schedule and stores any new articles.
+
+    Inputs:
+    - queries (list of str): The queries to track.
+    - interval (float): The normal number of seconds between fetches of each query.
+    - result_size (int): The number of results to request per query.
+    - jitter (float): Fraction of each delay to randomly add or remove.
+    - max_backoff (float): The longest delay in seconds after repeated failures.
+    - max_concurrency (int): The maximum number of API calls in flight at once.
+    - duration (float): Seconds to run for before stopping, or None to run forever.
+    - chunk_size (int): The number of articles parsed, enriched and stored at a time.
+    - ner_mode (str): The entity extraction mode, one of sentiment.NER_MODES. Defaults to sentiment.NER_MODE.
+
+    Returns:
+    - None
+    """
+
+    # Queries differing only in case or spacing share stored results, so only the first form given is fetched
+    queries = store.distinct_queries(queries)
+    end_time = time.monotonic() + duration if duration is not None else None
+
+    # Spread the first round out so the queries don't all fire at once
+    schedule = {query_text: {'next_run': time.monotonic() + random.uniform(0, jitter * interval), 'failures': 0} for query_text in queries}
+
+    ensure_pool_size(max_concurrency)
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        while end_time is None or time.monotonic() < end_time:
+            now = time.monotonic()
+            due = [query_text for query_text, state in schedule.items() if state['next_run'] <= now]
+
+            # Stream every due query concurrently, storing new articles as each chunk arrives
+            results = executor.map(lambda query_text: collect_stream(query_text, result_size, chunk_size, ner_mode), due)
+
+            for query_text, (new_count, error) in zip(due, results):
+                state = schedule[query_text]
+
+                if error is not None:
+                    state['failures'] += 1
+                    print(f"[{query_text}] {error} (failure {state['failures']})")
+                else:
+                    state['failures'] = 0
+                    store.mark_fetched(store.normalise_query(query_text))
+                    print(f"[{query_text}] Stored {new_count} new articles." if new_count else f"[{query_text}] No new articles found.")
+
+                state['next_run'] = time.monotonic() + next_delay(interval, state['failures'], jitter, max_backoff)
+
+            # Sleep until the next query is due
+            wait = min(state['next_run'] for state in schedule.values()) - time.monotonic()
+            if end_time is not None:
+                wait = min(wait, end_time - time.monotonic())
+            if wait > 0:
+                time.sleep(wait)
+
+
+# --- Main execution block for the long-running collector ---
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Collect and enrich new articles for tracked queries into the article store.")
+    parser.add_argument("queries", nargs="+", help="The queries to track.")
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL, help="Seconds between fetches of each query.")
+    parser.add_argument("--result-size", type=int, default=DEFAULT_RESULT_SIZE, help="Number of results to request per query.")
+    parser.add_argument("--jitter", type=float, default=DEFAULT_JITTER, help="Fraction of each delay to randomly add or remove.")
+    parser.add_argument("--max-backoff", type=float, default=DEFAULT_MAX_BACKOFF, help="Longest delay in seconds after repeated failures.")
+    parser.add_argument("--max-concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY, help="Maximum number of API calls in flight at once.")
+    parser.add_argument("--duration", type=float, default=None, help="Seconds to run for before stopping (runs forever if omitted).")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Articles parsed, enriched and stored at a time.")
+    parser.add_argument("--ner-mode", choices=sentiment.NER_MODES, default=sentiment.NER_MODE, help="Entity extraction mode, trading accuracy for throughput.")
+    args = parser.parse_args()
+
+    run_collector(
+        args.queries,
+        interval=args.interval,
+        result_size=args.result_size,
+        jitter=args.jitter,
+        max_backoff=args.max_backoff,
+        max_concurrency=args.max_concurrency,
+        duration=args.duration,
+        chunk_size=args.chunk_size,
+        ner_mode=args.ner_mode,
+    )
@@ -0,0 +1,104 @@
+import os
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- Configuration ---
+DATASET_PATH = os.getenv("ENRICHED_DATASET_PATH", "enriched")
+
+# Columns holding lists of strings, stored as native Parquet list columns
+LIST_COLUMNS = ['people', 'organizations', 'highlights']
+
+# Partition column derived from each article's timestamp
+PARTITION_COLUMN = 'date'
+
+
+def write_enriched_articles(dataframe: pd.DataFrame, path=None):
+    """
+    Appends enriched articles to the Parquet dataset, partitioned by publication date.
+
+    Inputs:
+    - dataframe (pd.DataFrame): Cleaned articles with a datetime 'timestamp' column.
+    - path (str): Root directory of the dataset. Defaults to DATASET_PATH.
+
+    Returns:
+    - int: The number of articles written.
+    """
+
+    if dataframe.empty:
+        return 0
+
+    # Partition on the UTC calendar date so loads for a time window only open the matching directories
+    timestamps = pd.to_datetime(dataframe['timestamp'], utc=True)
+    plain_df = dataframe.drop(columns=[column for column in LIST_COLUMNS if column in dataframe.columns])
+    plain_df = plain_df.assign(timestamp=timestamps, **{PARTITION_COLUMN: timestamps.dt.strftime('%Y-%m-%d')})
+    table = pa.Table.from_pandas(plain_df, preserve_index=False)
+
+    # Give list columns an explicit type so rows with empty lists still get list<string>
+    for column in LIST_COLUMNS:
+        if column in dataframe.columns:
+            values = [list(value) if isinstance(value, (list, tuple)) else [] for value in dataframe[column]]
+            table = table.append_column(column, pa.array(values, type=pa.list_(pa.string())))
+
+    # A unique file name per write keeps earlier files in the same partition intact
+    pq.write_to_dataset(
+        table,
+        root_path=path or DATASET_PATH,
+        partition_cols=[PARTITION_COLUMN],
+        basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+        existing_data_behavior='overwrite_or_ignore',
+    )
+
+    return len(dataframe)
+
+
+def read_enriched_articles(columns=None, query_text=None, start_date=None, path=None):
+    """
+    Loads enriched articles from the Parquet dataset, reading only the requested columns.
+
+    Inputs:
+    - columns (list of str): The columns to load, or None for all of them.
+    - query_text (str): Only load articles collected for this query, if given.
+    - start_date (datetime): Only load articles published on or after this time, if given.
+    - path (str): Root directory of the dataset. Defaults to DATASET_PATH.
+
+    Returns:
+    - pd.DataFrame: The articles, newest first, or an empty DataFrame if the dataset doesn't exist.
+    """
+
+    path = path or DATASET_PATH
+    if not os.path.exists(path):
+        return pd.DataFrame()
+
+    filters = []
+    if query_text is not None:
+        filters.append(('query_text', '==', query_text))
+    if start_date is not None:
+        start_date = pd.Timestamp(start_date)
+        start_date = start_date.tz_localize('UTC') if start_date.tzinfo is None else start_date.tz_convert('UTC')
+
+        # The date filter prunes whole partitions, the timestamp filter trims the first day
+        filters.append((PARTITION_COLUMN, '>=', start_date.strftime('%Y-%m-%d')))
+        filters.append(('timestamp', '>=', start_date))
+
+    # The columns needed for de-duplicating and sorting are loaded even if not requested
+    read_columns = None
+    if columns is not None:
+        read_columns = list(dict.fromkeys([*columns, 'id', 'timestamp']))
+
+    dataframe = pd.read_parquet(path, columns=read_columns, filters=filters or None)
+    if PARTITION_COLUMN in dataframe.columns and (columns is None or PARTITION_COLUMN not in columns):
+        dataframe = dataframe.drop(columns=[PARTITION_COLUMN])
+
+    # An article re-collected under the same query is kept once
+    dedup_columns = [column for column in ['id', 'query_text'] if column in dataframe.columns]
+    if dedup_columns:
+        dataframe = dataframe.drop_duplicates(subset=dedup_columns, keep='last')
+
+    dataframe = dataframe.sort_values(by='timestamp', ascending=False, ignore_index=True)
+    return dataframe if columns is None else dataframe[columns]
@@ -0,0 +1,179 @@
+import re
+import zlib
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+# --- Configuration ---
+SHINGLE_SIZE = 3 # Words per shingle
+NUM_BANDS = 16 # LSH bands; NUM_BANDS * ROWS_PER_BAND MinHash values per article
+ROWS_PER_BAND = 4
+DEFAULT_THRESHOLD = 0.5 # Estimated Jaccard similarity above which two articles are copies
+SIGNATURE_CHUNK_SIZE = 1000 # Articles signed per vectorized MinHash step
+
+# Parameters of the MinHash permutations h(x) = (a * x + b) mod p, fixed so clusters are reproducible
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(2025)
+_A = _rng.integers(1, _PRIME, size=NUM_BANDS * ROWS_PER_BAND, dtype=np.int64)
+_B = _rng.integers(0, _PRIME, size=NUM_BANDS * ROWS_PER_BAND, dtype=np.int64)
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+def shingle_hashes(text):
+    """
+    Hashes the overlapping word n-grams of a text.
+
+    Inputs:
+    - text (str): The text to shingle.
+
+    Returns:
+    - np.ndarray: The distinct shingle hashes.
+    """
+
+    words = _WORD_PATTERN.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        shingles = [" ".join(words)]
+    else:
+        shingles = [" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)]
+
+    return np.unique(np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles), dtype=np.int64, count=len(shingles)))
+
+
+def minhash_signatures(texts):
+    """
+    Computes a MinHash signature for each text.
+
+    Inputs:
+    - texts (list of str): The texts to sign.
+
+    Returns:
+    - np.ndarray: A (len(texts), NUM_BANDS * ROWS_PER_BAND) array of signatures.
+    """
+
+    signatures = np.empty((len(texts), len(_A)), dtype=np.int64)
+
+    # Texts are signed in chunks so the permuted shingle matrix stays small
+    for start in range(0, len(texts), SIGNATURE_CHUNK_SIZE):
+        shingles = [shingle_hashes(text) for text in texts[start:start + SIGNATURE_CHUNK_SIZE]]
+        offsets = np.cumsum([0] + [len(hashes) for hashes in shingles[:-1]])
+        hashes = np.concatenate(shingles) % _PRIME
+
+        # Apply every permutation to every shingle, then keep each text's minimum per permutation
+        permuted = (_A[:, None] * hashes[None, :] + _B[:, None]) % _PRIME
+        signatures[start:start + len(shingles)] = np.minimum.reduceat(permuted, offsets, axis=1).T
+
+    return signatures
+
+
+def cluster_labels(texts, threshold=DEFAULT_THRESHOLD):
+    """
+    Groups near-duplicate texts using MinHash and locality-sensitive hashing.
+
+    Inputs:
+    - texts (list of str): The texts to cluster.
+    - threshold (float): Estimated Jaccard similarity above which two texts are treated as copies.
+
+    Returns:
+    - np.ndarray: For each text, the position of the first text in its cluster. Every text in a cluster
+      is similar to that first text, so similarity is never chained through intermediate texts.
+    """
+
+    signatures = minhash_signatures(texts)
+    parents = np.arange(len(texts))
+    members = {position: [position] for position in range(len(texts))}
+
+    def find(position):
+        # Union-find with path halving
+        while parents[position] != position:
+            parents[position] = parents[parents[position]]
+            position = parents[position]
+        return position
+
+    # Texts sharing any band of their signature become candidate pairs
+    for band in range(NUM_BANDS):
+        buckets = defaultdict(list)
+        band_values = signatures[:, band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        for position, key in enumerate(map(bytes, band_values)):
+            buckets[key].append(position)
+
+        for positions in buckets.values():
+            first = positions[0]
+            for other in positions[1:]:
+                root, other_root = find(first), find(other)
+                if root == other_root:
+                    continue
+
+                # Complete linkage against the representative: the merged cluster keeps the earlier root, and
+                # every member of the cluster it absorbs must be a copy of that root by its full signature
+                root, absorbed = min(root, other_root), max(root, other_root)
+                agreement = np.mean(signatures[members[absorbed]] == signatures[root], axis=1)
+                if np.all(agreement >= threshold):
+                    parents[absorbed] = root
+                    members[root].extend(members.pop(absorbed))
+
+    return np.array([find(position) for position in range(len(texts))], dtype=np.int64)
+
+
+def _article_texts(dataframe: pd.DataFrame):
+    """
+    Joins each article's title and summary into the text its copies are matched on.
+    """
+
+    return (dataframe['title'].fillna('').astype(str) + " " + dataframe['summary'].fillna('').astype(str)).tolist()
+
+
+def collapse_duplicates(dataframe: pd.DataFrame, threshold=DEFAULT_THRESHOLD):
+    """
+    Collapses syndicated copies of the same story into one row per cluster.
+
+    Inputs:
+    - dataframe (pd.DataFrame): Articles with 'title' and 'summary' columns.
+    - threshold (float): Estimated Jaccard similarity above which two articles are treated as copies.
+
+    Returns:
+    - pd.DataFrame: The first article of each cluster, in the input order, with a 'copies' column
+      counting the articles it stands for.
+    """
+
+    if dataframe.empty:
+        return dataframe.assign(copies=pd.Series(dtype=int))
+
+    labels = cluster_labels(_article_texts(dataframe), threshold)
+
+    # Every cluster is labelled with its first position, so the representatives are the self-labelled rows
+    representatives = np.flatnonzero(labels == np.arange(len(labels)))
+    copies = np.bincount(labels, minlength=len(labels))[representatives]
+
+    return dataframe.iloc[representatives].assign(copies=copies)
+
+
+def enrich_stories(dataframe: pd.DataFrame, enrich, threshold=DEFAULT_THRESHOLD):
+    """
+    Runs an enrichment once per story, so syndicated copies aren't analysed again, and gives every copy
+    its story's results.
+
+    Inputs:
+    - dataframe (pd.DataFrame): Articles with 'title' and 'summary' columns.
+    - enrich (callable): Adds columns to the DataFrame it is given, in place (e.g. package_articles_with_sentiment_info).
+    - threshold (float): Estimated Jaccard similarity above which two articles are treated as copies.
+
+    Returns:
+    - None: The function modifies the DataFrame in place, adding the columns enrich adds.
+    """
+
+    if dataframe.empty:
+        enrich(dataframe)
+        return
+
+    labels = cluster_labels(_article_texts(dataframe), threshold)
+    representatives = np.unique(labels)
+
+    stories = dataframe.iloc[representatives].copy()
+    enrich(stories)
+
+    # Every article takes the results of its cluster's representative
+    story_rows = np.searchsorted(representatives, labels)
+    for column in stories.columns.difference(dataframe.columns):
+        dataframe[column] = stories[column].iloc[story_rows].set_axis(dataframe.index)
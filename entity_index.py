@@ -0,0 +1,185 @@
+import numpy as np
+import pandas as pd
+
+
+class EntityColumn:
+    """
+    A column of entity lists stored compactly. Each distinct name is kept once in a shared vocabulary,
+    and each row is a run of integer codes into it (CSR layout): row i mentions
+    vocabulary[codes[offsets[i]:offsets[i + 1]]].
+    """
+
+    __slots__ = ('vocabulary', 'codes', 'offsets')
+
+    def __init__(self, vocabulary, codes, offsets):
+        self.vocabulary = vocabulary
+        self.codes = codes
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def row(self, position):
+        """
+        Returns the entity names mentioned in one row.
+        """
+
+        return self.vocabulary[self.codes[self.offsets[position]:self.offsets[position + 1]]].tolist()
+
+    def rows(self, positions):
+        """
+        Returns the entity names mentioned in each of the given rows, as lists.
+        """
+
+        return [self.row(position) for position in positions]
+
+
+def encode_entities(entity_lists):
+    """
+    Encodes a column of entity lists into an EntityColumn.
+
+    Inputs:
+    - entity_lists (pd.Series): A Series where each value is a list of entity names (e.g. the 'people' column).
+      Missing values are treated as empty lists.
+
+    Returns:
+    - EntityColumn: The compact column, with one row per value in the same order.
+    """
+
+    # Flatten every list into one sequence of names, remembering where each row's names end
+    names = []
+    offsets = np.zeros(len(entity_lists) + 1, dtype=np.int64)
+    for position, entities in enumerate(entity_lists):
+        if isinstance(entities, (list, tuple, np.ndarray)):
+            names.extend(name for name in entities if isinstance(name, str))
+        offsets[position + 1] = len(names)
+
+    # Each distinct name becomes one vocabulary entry, shared by every row that mentions it
+    codes, vocabulary = pd.factorize(np.array(names, dtype=object))
+    return EntityColumn(np.asarray(vocabulary, dtype=object), codes.astype(np.int32), offsets)
+
+
+def build_entity_index(entities):
+    """
+    Builds an inverted index from each entity to the row positions that mention it.
+
+    Inputs:
+    - entities (EntityColumn or pd.Series): An encoded column, or a Series where each value is a list of
+      entity names (e.g. the 'people' column).
+
+    Returns:
+    - dict: A mapping of entity name to a sorted numpy array of row positions.
+    """
+
+    if not isinstance(entities, EntityColumn):
+        entities = encode_entities(entities)
+
+    if len(entities.codes) == 0:
+        return {}
+
+    # Label every mention with its row position, then group the mentions by entity code
+    rows = np.repeat(np.arange(len(entities)), np.diff(entities.offsets))
+    order = np.argsort(entities.codes, kind='stable')
+    sorted_codes = entities.codes[order]
+    boundaries = np.flatnonzero(np.diff(sorted_codes)) + 1
+
+    # The stable sort keeps each group's rows in order; np.unique drops rows naming an entity twice
+    groups = np.split(rows[order], boundaries)
+    return {entities.vocabulary[code]: np.unique(positions) for code, positions in zip(sorted_codes[np.r_[0, boundaries]], groups)}
+
+
+def restrict_index(index, start, stop):
+    """
+    Limits an inverted index to a contiguous range of row positions, such as a time window of a sorted frame.
+
+    Inputs:
+    - index (dict): An inverted index built by build_entity_index.
+    - start (int): The first row position to keep.
+    - stop (int): The row position to stop before.
+
+    Returns:
+    - dict: A mapping of entity name to the sorted row positions in the range, leaving out entities
+      with no rows in it.
+    """
+
+    restricted = {}
+    for entity, positions in index.items():
+        # Positions are sorted, so the range is found by binary search rather than a scan
+        in_range = positions[np.searchsorted(positions, start, side='left'):np.searchsorted(positions, stop, side='left')]
+        if len(in_range):
+            restricted[entity] = in_range
+
+    return restricted
+
+
+def entity_options(index):
+    """
+    Lists the entities in an index, most frequently mentioned first.
+
+    Inputs:
+    - index (dict): An inverted index built by build_entity_index.
+
+    Returns:
+    - list: Entity names sorted by the number of rows mentioning them, then alphabetically.
+    """
+
+    return sorted(index, key=lambda entity: (-len(index[entity]), entity))
+
+
+def entity_counts(index):
+    """
+    Counts the rows mentioning each entity in an index.
+
+    Inputs:
+    - index (dict): An inverted index built by build_entity_index.
+
+    Returns:
+    - dict: A mapping of entity name to the number of rows mentioning it.
+    """
+
+    return {entity: len(positions) for entity, positions in index.items()}
+
+
+def rows_mentioning_any(index, entities):
+    """
+    Finds the rows that mention at least one of the given entities.
+
+    Inputs:
+    - index (dict): An inverted index built by build_entity_index.
+    - entities (list): The entity names to look up.
+
+    Returns:
+    - np.ndarray: A sorted array of row positions.
+    """
+
+    position_arrays = [index[entity] for entity in entities if entity in index]
+
+    if not position_arrays:
+        return np.array([], dtype=np.int64)
+
+    return np.unique(np.concatenate(position_arrays))
+
+
+def select_rows(indexes, selections):
+    """
+    Finds the rows matching every entity filter, where each filter matches rows mentioning any of its entities.
+
+    Inputs:
+    - indexes (dict): A mapping of column name (e.g. 'people') to its inverted index.
+    - selections (dict): A mapping of column name to the list of selected entity names.
+      Columns with an empty selection are ignored.
+
+    Returns:
+    - np.ndarray: A sorted array of matching row positions, or None if nothing is selected.
+    """
+
+    selected_rows = None
+
+    for column, entities in selections.items():
+        if not entities:
+            continue
+
+        rows = rows_mentioning_any(indexes[column], entities)
+        selected_rows = rows if selected_rows is None else np.intersect1d(selected_rows, rows, assume_unique=True)
+
+    return selected_rows
@@ -4,7 +4,17 @@ import pandas as pd
 from datetime import datetime, timedelta
 import pytz # For timezone handling
 import os 
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+import metrics
+import store
+from singleflight import SingleFlight
 
 load_dotenv()
 
@@ -14,24 +24,241 @@ API_KEY = os.getenv("API_KEY") # Our team's API Key
 
 DEFAULT_QUERY_TEXT = "US president Trump" # <--- Using the query that reliably returned data
 DEFAULT_RESULT_SIZE = 20 # <--- Using a safe result size for stability
+LONDON_TZ = 'Europe/London' # Timezone the dashboard displays times in
+DEFAULT_TIMEOUT = 30 # Seconds to wait for each API call
+DEFAULT_MAX_CONCURRENCY = 8 # Maximum number of API calls in flight at once
+DEFAULT_CHUNK_SIZE = 100 # Articles per DataFrame when streaming results
+STREAM_READ_SIZE = 64 * 1024 # Bytes read from the response at a time when streaming
+MAX_RETRIES = 3 # Extra attempts after a failed API call
+BACKOFF_BASE = 0.5 # Seconds before the first retry, doubled on each further retry
+BACKOFF_MAX = 8 # Longest wait in seconds between retries
+RETRY_STATUS_CODES = {403, 429, 500, 502, 503, 504} # The API answered 403 while overloaded during the hackathon
+BREAKER_FAILURE_THRESHOLD = 5 # Consecutive failed calls before the API is left alone
+BREAKER_RESET_SECONDS = 60 # Seconds to leave the API alone before trying it again
+API_RATE_LIMIT = float(os.getenv("API_RATE_LIMIT", "5")) # API calls per second across the process, 0 for no limit
+API_RATE_BURST = 5 # API calls that can be made at once before the rate limit applies
+STALE_AFTER_SECONDS = 300 # Age of stored results after which they are refreshed in the background
+
+# One keep-alive session shared by every API call, with a connection pool sized for concurrent fetches
+session = requests.Session()
+_pool_size = 0
+_pool_lock = threading.Lock()
+
+def ensure_pool_size(max_concurrency):
+    """
+    Grows the shared session's connection pool so that many concurrent calls each get a kept-alive
+    connection instead of queueing for one.
+    
+    Inputs:
+    - max_concurrency (int): The most API calls that will be in flight at once.
+    
+    Returns:
+    - None
+    """
+
+    global _pool_size
+
+    with _pool_lock:
+        if max_concurrency <= _pool_size:
+            return
+
+        # Calls already in flight keep the connections of the adapter they started on
+        session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency))
+        session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency))
+        _pool_size = max_concurrency
 
-def fetch_and_process_data(query_text, result_size):
+ensure_pool_size(DEFAULT_MAX_CONCURRENCY)
+
+class CircuitOpenError(requests.exceptions.RequestException):
     """
-    Fetches data from the live API and processes it into a DataFrame.
+    Raised instead of calling the API while the circuit breaker is open.
+    """
+
+class CircuitBreaker:
+    """
+    Stops calling the API after repeated failures, then lets a single trial call through once
+    the reset period has passed. A successful call closes the circuit again; a call that says
+    nothing about the API's health lets another trial through instead.
+    """
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_seconds=BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    def allow(self):
+        """
+        Returns whether a call may be made now.
+        """
+
+        with self._lock:
+            if self._opened_at is None:
+                return True
+
+            # Half-open: one trial call decides whether the circuit closes or stays open
+            if not self._trial_in_flight and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self._trial_in_flight = True
+                return True
+
+            return False
+
+    def seconds_until_retry(self):
+        """
+        Returns how long until the next trial call is allowed.
+        """
+
+        with self._lock:
+            if self._opened_at is None:
+                return 0
+            return max(0, self.reset_seconds - (time.monotonic() - self._opened_at))
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_neutral(self):
+        # Neither closes the circuit nor counts towards opening it, but frees the half-open trial slot
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+class RateLimiter:
+    """
+    Token bucket that spaces out API calls made from any thread in the process.
+    """
+
+    def __init__(self, rate=API_RATE_LIMIT, burst=API_RATE_BURST):
+        self.rate = rate
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._tokens = burst
+        self._updated = time.monotonic()
+
+    def acquire(self):
+        """
+        Blocks until a call may be made.
+        """
+
+        if self.rate <= 0:
+            return
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                wait = (1 - self._tokens) / self.rate
+
+            time.sleep(wait)
+
+breaker = CircuitBreaker()
+rate_limiter = RateLimiter()
+
+def retry_delay(attempt, response=None):
+    """
+    Works out how long to wait before retrying a failed API call.
     
     Inputs:
-    - query_text (str): The text to query the API for.
-    - result_size (int): The number of results to retrieve.
+    - attempt (int): The number of the failed attempt, starting from 0.
+    - response (requests.Response): The failed response, if the API answered.
     
     Returns:
-    - pd.DataFrame: A DataFrame containing the processed results or an error message.
+    - float: The delay in seconds.
+    """
+
+    # Honour the API's own Retry-After when it gives one in seconds
+    retry_after = response.headers.get("Retry-After", "") if response is not None else ""
+    if retry_after.isdigit():
+        return min(float(retry_after), BACKOFF_MAX)
+
+    # Exponential backoff with full jitter, so concurrent callers don't retry in lockstep
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+def post_to_api(payload, timeout=DEFAULT_TIMEOUT, stream=False):
+    """
+    Posts a query to the live API through the rate limiter and circuit breaker, retrying
+    timeouts, connection errors and overload responses.
+    
+    Inputs:
+    - payload (dict): The request body.
+    - timeout (float): Seconds to wait for each attempt.
+    - stream (bool): Leave the response body to be read as it arrives.
+    
+    Returns:
+    - requests.Response: The successful response.
+    
+    Raises:
+    - CircuitOpenError: If the API has failed repeatedly and is being left alone.
+    - requests.exceptions.RequestException: If the call still fails after every retry.
     """
 
-    # Define headers and payload for the API request
+    if not breaker.allow():
+        raise CircuitOpenError(f"Live API is failing; next attempt in {breaker.seconds_until_retry():.0f}s")
+
+    # Define headers for the API request
     headers = {
         "Content-Type": "application/json",
         "x-api-key": API_KEY
     }
+
+    for attempt in range(MAX_RETRIES + 1):
+        rate_limiter.acquire()
+        response = None
+        try:
+            response = session.post(API_URL, headers=headers, data=json.dumps(payload), timeout=timeout, stream=stream)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            if response is not None:
+                response.close()
+
+            status_code = e.response.status_code if e.response is not None else None
+            retryable = isinstance(e, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)) or status_code in RETRY_STATUS_CODES
+
+            if not retryable:
+                # Errors that retrying can't fix say nothing about whether the API is up
+                breaker.record_neutral()
+                raise
+            if attempt == MAX_RETRIES:
+                breaker.record_failure()
+                raise
+
+            time.sleep(retry_delay(attempt, e.response))
+            continue
+
+        breaker.record_success()
+        return response
+
+@metrics.instrument("fetch_and_process_data", count_result=True)
+def fetch_and_process_data(query_text, result_size, timeout=DEFAULT_TIMEOUT):
+    """
+    Fetches data from the live API and processes it into a DataFrame.
+    
+    Inputs:
+    - query_text (str): The text to query the API for.
+    - result_size (int): The number of results to retrieve.
+    - timeout (float): Seconds to wait for the API to respond.
+    
+    Returns:
+    - pd.DataFrame: A DataFrame containing the processed results or an error message.
+    """
+
+    # Define the payload for the API request
     payload = {
       "query_text": query_text,
       "result_size": result_size,
@@ -39,9 +266,8 @@ def fetch_and_process_data(query_text, result_size):
     }
 
     try:
-        # Attempt to make the API call
-        response = requests.post(API_URL, headers=headers, data=json.dumps(payload), timeout=30)
-        response.raise_for_status()
+        # Attempt to make the API call, retrying transient failures
+        response = post_to_api(payload, timeout=timeout)
 
         # Decode the JSON response
         json_response = response.json()
@@ -75,62 +301,284 @@ def fetch_and_process_data(query_text, result_size):
             'message': ["Could not decode JSON from API response. Response was not valid JSON."]
         })
     
-def fetch_or_retrieve_cached_data(query_text, result_size):
+_RESULTS_START = re.compile(r'"results"\s*:\s*\[')
+
+def iter_json_results(text_chunks):
+    """
+    Incrementally parses the articles in a response's 'results' array as the text arrives.
+    
+    Inputs:
+    - text_chunks (iterable of str): The response body, in pieces.
+    
+    Returns:
+    - generator: Yields one article dictionary at a time.
+    
+    Raises:
+    - KeyError: If the response has no 'results' array.
+    - json.JSONDecodeError: If an article in the array is not valid JSON.
+    """
+
+    decoder = json.JSONDecoder()
+    text_chunks = iter(text_chunks)
+    buffer = ""
+    position = None
+
+    # Read until the start of the results array has arrived
+    for text in text_chunks:
+        buffer += text
+        match = _RESULTS_START.search(buffer)
+        if match:
+            position = match.end()
+            break
+
+    if position is None:
+        raise KeyError("results")
+
+    while True:
+        # Skip the separators between articles
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            position += 1
+
+        if position < len(buffer) and buffer[position] == "]":
+            return
+
+        try:
+            article, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            # The next article is incomplete, so read more of the response
+            text = next(text_chunks, None)
+            if text is None:
+                raise
+
+            # Drop the articles already parsed so the buffer only holds the one in progress
+            buffer = buffer[position:] + text
+            position = 0
+            continue
+
+        yield article
+
+def iter_fetch_and_process_data(query_text, result_size, chunk_size=DEFAULT_CHUNK_SIZE, timeout=DEFAULT_TIMEOUT):
     """
-    Fetches data from the live API or retrieves cached data if available.
+    Fetches data from the live API as a stream, yielding DataFrames of articles as they are parsed.
     
     Inputs:
     - query_text (str): The text to query the API for.
     - result_size (int): The number of results to retrieve.
+    - chunk_size (int): The number of articles per yielded DataFrame.
+    - timeout (float): Seconds to wait for the API to respond.
     
     Returns:
-    - pd.DataFrame: A DataFrame containing the processed results or an error message.
+    - generator: Yields DataFrames of processed results. If the request fails, a DataFrame with
+      an error message is yielded and the stream ends.
     """
-    
+
+    # Define the payload for the API request
+    payload = {
+      "query_text": query_text,
+      "result_size": result_size,
+      "include_highlights": True,
+    }
+
     try:
-        # Check if the cached data file exists
-        df_csv = pd.read_csv("cached_data.csv")
+        # Attempt to make the API call, leaving the body to be read as it arrives.
+        # Only the request is retried; a stream that fails part way ends with an error message.
+        with post_to_api(payload, timeout=timeout, stream=True) as response:
+            response.encoding = response.encoding or "utf-8"
+
+            articles = []
+            for article in iter_json_results(response.iter_content(chunk_size=STREAM_READ_SIZE, decode_unicode=True)):
+                articles.append(article)
+
+                if len(articles) == chunk_size:
+                    yield pd.json_normalize(articles)
+                    articles = []
+
+            if articles:
+                yield pd.json_normalize(articles)
+
+    except KeyError:
+        # If the 'results' key is not found, yield an error message
+        yield pd.DataFrame({
+            "message": ["Live API call failed: 'results' key not found in response."]
+        })
 
-        # Check if the query_text exists in the cached data
-        if not df_csv[df_csv['query_text'] == query_text].empty:
+    except requests.exceptions.Timeout:
+        # Handle timeout, yield appropriate error message
+        yield pd.DataFrame({
+            'message': ["API request timed out. No further articles retrieved."]
+        })
 
-            # Count the number of cached entries for the query_text
-            cached_data_count = df_csv[df_csv['query_text'] == query_text].shape[0]
+    except requests.exceptions.RequestException as e:
+        # Handle other request exceptions, yield appropriate error message
+        yield pd.DataFrame({
+            'message': [f"Error retrieving data: {e}. No further articles retrieved."]
+        })
 
-            # If there are enough cached entries, return the most recent ones
-            if cached_data_count >= result_size:
-                sorted_cached_df = df_csv[df_csv['query_text'] == query_text].sort_values(by='timestamp', ascending=False)
-                return sorted_cached_df.head(result_size)
-            
-    except FileNotFoundError:
+    except json.JSONDecodeError:
+        # Handle JSON decode error, yield appropriate error message
+        yield pd.DataFrame({
+            'message': ["Could not decode JSON from API response. Response was not valid JSON."]
+        })
+    
+def fetch_many(queries, max_concurrency=DEFAULT_MAX_CONCURRENCY, timeout=DEFAULT_TIMEOUT):
+    """
+    Fetches several queries from the live API concurrently.
+    
+    Inputs:
+    - queries (list of tuple): (query_text, result_size) pairs to fetch.
+    - max_concurrency (int): The maximum number of API calls in flight at once.
+    - timeout (float): Seconds to wait for each API call.
+    
+    Returns:
+    - list: A DataFrame per query, in the same order, holding its processed results or an error message.
+    """
 
-        # If the cached data file does not exist, we will fetch new data
-        ...
+    if not queries:
+        return []
+
+    # Run the calls on a bounded thread pool over the shared session, with a connection for each
+    ensure_pool_size(max_concurrency)
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        return list(executor.map(lambda query: fetch_and_process_data(query[0], query[1], timeout=timeout), queries))
+
+# Dashboard loads and background refreshes of the same query at once share one API call
+refresh_flights = SingleFlight("refresh_single_flight")
+
+def refresh_query(query_text, result_size):
+    """
+    Fetches a query from the live API and stores the results. Concurrent refreshes of the same query,
+    from the foreground or the background, share one API call.
+    
+    Inputs:
+    - query_text (str): The text to query the API for. It is stored under store.normalise_query(query_text).
+    - result_size (int): The number of results to retrieve.
+    
+    Returns:
+    - pd.DataFrame: A DataFrame containing the processed results or an error message.
+    """
+
+    # Every caller gets its own copy, as callers clean and enrich the frame in place
+    query_key = store.normalise_query(query_text)
+    return refresh_flights.do((query_key, result_size), _refresh_query, query_text, query_key, result_size).copy()
+
+def _refresh_query(query_text, query_key, result_size):
+    """
+    Fetches a query from the live API and stores the results under the normalised query.
+    """
 
-    # Fetch new data from the live API
     df = fetch_and_process_data(query_text, result_size)
 
     if 'message' in df.columns and not df['message'].empty:
         # If there is an error message, return it
         return df
 
+    # The API answered, so the stored results for this query are up to date
+    store.mark_fetched(query_key)
+
     # If the DataFrame is empty, return an empty DataFrame with a message
     if df.empty:
         return pd.DataFrame({
             'message': [f"No articles retrieved for query: '{query_text}'. Please try a different query or check the API status."]
         })
-    
 
     # If we have valid data, we will cache it
-    df['query_text'] = query_text
-    df.to_csv("cached_data.csv", mode='a', header=not os.path.exists("cached_data.csv"), index=False)
+    df['query_text'] = query_key
+    store.upsert_articles(query_key, df)
 
-    # Return the DataFrame with the new data
     return df
 
+# Background refreshes of stale queries, at most one per query at a time
+_refresh_executor = ThreadPoolExecutor(max_workers=2)
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+def refresh_in_background(query_text, result_size):
+    """
+    Starts refreshing a query on a background thread, unless a refresh is already running.
+    
+    Inputs:
+    - query_text (str): The text to query the API for.
+    - result_size (int): The number of results to retrieve.
+    
+    Returns:
+    - bool: Whether a refresh was started.
+    """
+
+    query_key = store.normalise_query(query_text)
+    with _refreshing_lock:
+        if query_key in _refreshing:
+            return False
+        _refreshing.add(query_key)
+
+    def refresh():
+        try:
+            df = refresh_query(query_text, result_size)
+            if 'message' in df.columns:
+                print(f"[{query_text}] Background refresh failed: {df['message'].iloc[0]}")
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(query_key)
+
+    _refresh_executor.submit(refresh)
+    return True
+
+@metrics.instrument("fetch_or_retrieve_cached_data", count_result=True)
+def fetch_or_retrieve_cached_data(query_text, result_size):
+    """
+    Retrieves stored data for a query if there is a full result set of it, or it was fetched recently,
+    refreshing it in the background once it is stale. A partial, stale result set waits for the live
+    API, falling back to the stored articles if it fails. With nothing stored for the query, answers
+    from a full-text search of every stored article while the live API is queried in the background,
+    and only waits for the API when nothing stored matches.
+    
+    Inputs:
+    - query_text (str): The text to query the API for. Results are stored and looked up under
+      store.normalise_query(query_text).
+    - result_size (int): The number of results to retrieve.
+    
+    Returns:
+    - pd.DataFrame: A DataFrame containing the processed results or an error message.
+    """
+    
+    query_key = store.normalise_query(query_text)
+
+    # Serve the most recent stored articles straight away, so a slow or failing API doesn't hold up the caller
+    cached_df = store.latest_articles(query_key, result_size)
+    last_fetched = store.last_fetched(query_key)
+    fresh = last_fetched is not None and time.time() - last_fetched <= STALE_AFTER_SECONDS
+    if len(cached_df) >= result_size or (fresh and not cached_df.empty):
+        metrics.record_cache("article_store", hits=1)
+
+        if not fresh:
+            refresh_in_background(query_text, result_size)
+
+        return cached_df
+
+    metrics.record_cache("article_store", misses=1)
+
+    # A few stored articles can't stand in for a full result set, so wait for the API unless it fails
+    if not cached_df.empty:
+        df = refresh_query(query_text, result_size)
+        return cached_df if 'message' in df.columns else df
+
+    # Articles stored for other queries often cover a new search too, so answer from the full-text index
+    # and only ask the live API for fresher results in the background
+    local_df = store.search_articles(query_key, result_size)
+    metrics.record_cache("article_search", hits=int(not local_df.empty), misses=int(local_df.empty))
+    if not local_df.empty:
+        refresh_in_background(query_text, result_size)
+        local_df['query_text'] = query_key
+        return local_df
+
+    # Nothing stored matches this query yet, so fetch new data from the live API
+    return refresh_query(query_text, result_size)
+
+@metrics.instrument("clean_articles")
 def clean_articles(dataframe):
     """
-    Cleans the articles DataFrame by removing duplicates and ensuring timestamps are in datetime format.
+    Cleans the articles DataFrame by removing rows without a valid timestamp, converting timestamps
+    to timezone-aware UTC datetimes and sorting the articles from oldest to newest. DataFrames
+    without a 'timestamp' column, such as error messages, are left as they are.
     
     Inputs:
     - dataframe (pd.DataFrame): The DataFrame containing articles.
@@ -139,40 +587,67 @@ def clean_articles(dataframe):
     - None: The DataFrame is modified in place.
     """
 
-    # Coerce timestamps to datetime format, converting errors to NaT
-    dataframe["timestamp"] = pd.to_datetime(dataframe["timestamp"], errors='coerce')
+    # Error message frames have no articles to clean
+    if "timestamp" not in dataframe.columns:
+        return
+
+    # Coerce timestamps to UTC datetimes, converting errors to NaT
+    dataframe["timestamp"] = pd.to_datetime(dataframe["timestamp"], errors='coerce', utc=True)
     
     # Drop rows with NaT in the timestamp column
     dataframe.dropna(subset=["timestamp"], inplace=True)
 
+    # Keep articles in time order so time ranges can be found by binary search
+    dataframe.sort_values(by="timestamp", inplace=True, kind="stable")
 
-def filter_articles_by_time(dataframe:pd.DataFrame, start_date):
+
+def localise_london(value):
     """
-    Filters the articles in a DataFrame by a specified time period.
+    Converts a datetime to a timezone-aware Timestamp, taking naive values as London time.
 
     Inputs:
-    - dataframe (pd.DataFrame): The DataFrame containing articles with a 'timestamp' column.
-    - start_date (datetime): The start date for filtering.
-    
+    - value (datetime): The datetime to convert.
+
     Returns:
-    - pd.DataFrame: A DataFrame containing articles within the specified time period."""
+    - pd.Timestamp: The timezone-aware Timestamp. Naive times repeated when the clocks go back are
+      taken as the later (GMT) one, and times skipped when the clocks go forward are moved forward
+      to the first valid time.
+    """
 
-    # Get the current date and time in London timezone
-    london_tz = pytz.timezone('Europe/London')
-    current_date = datetime.now(london_tz)
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is not None:
+        return timestamp
 
-    # Ensure DataFrame timestamps are timezone-aware and converted to London timezone
-    if dataframe['timestamp'].dt.tz is None:
-        dataframe['timestamp'] = dataframe['timestamp'].dt.tz_localize('UTC').dt.tz_convert(london_tz)
-    else:
-        dataframe['timestamp'] = dataframe['timestamp'].dt.tz_convert(london_tz)
+    return timestamp.tz_localize(LONDON_TZ, ambiguous=False, nonexistent='shift_forward')
 
-    if start_date.tzinfo is None:
-        start_date = london_tz.localize(start_date)
+@metrics.instrument("filter_articles_by_time")
+def filter_articles_by_time(dataframe:pd.DataFrame, start_date):
+    """
+    Filters the articles in a DataFrame by a specified time period.
 
-    # Filter the DataFrame for articles within the specified time period
-    filtered_df = dataframe[dataframe['timestamp'] >= start_date].copy()
-    return filtered_df.sort_values(by='timestamp', ascending=True)
+    Inputs:
+    - dataframe (pd.DataFrame): The DataFrame containing articles with a 'timestamp' column,
+      ideally already cleaned by clean_articles.
+    - start_date (datetime): The start date for filtering. Naive datetimes are taken as London time.
+    
+    Returns:
+    - pd.DataFrame: A slice of the articles within the specified time period, oldest first.
+      The input DataFrame is not modified."""
+
+    # Cleaned datasets are already UTC and sorted, so they are only normalised here if they aren't
+    timestamps = dataframe['timestamp']
+    if timestamps.dt.tz is None:
+        dataframe = dataframe.assign(timestamp=timestamps.dt.tz_localize('UTC'))
+    elif str(timestamps.dt.tz) != 'UTC':
+        dataframe = dataframe.assign(timestamp=timestamps.dt.tz_convert('UTC'))
+    if not dataframe['timestamp'].is_monotonic_increasing:
+        dataframe = dataframe.sort_values(by='timestamp', kind='stable')
+
+    start_date = localise_london(start_date)
+
+    # Binary search for the first article in the time period and slice from there
+    position = dataframe['timestamp'].searchsorted(start_date.tz_convert('UTC'), side='left')
+    return dataframe.iloc[position:]
 
 # --- Main execution block for console output ---
 if __name__ == "__main__":
@@ -0,0 +1,251 @@
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- Configuration ---
+METRICS_PREFIX = "newsyfi"
+METRICS_LOG_PATH = os.getenv("METRICS_LOG_PATH") # Opt-in JSON lines log, one record per timed call
+PROFILE_TOP_N = 25 # Functions listed in a profile report
+
+# Per-stage totals, shared by every thread in the process
+_lock = threading.Lock()
+_stages = {}
+_caches = {}
+_server = None
+
+
+def record_stage(stage, duration, articles=0):
+    """
+    Records one timed call of a pipeline stage.
+
+    Inputs:
+    - stage (str): The stage name.
+    - duration (float): How long the call took in seconds.
+    - articles (int): The number of articles the call handled.
+
+    Returns:
+    - None
+    """
+
+    with _lock:
+        totals = _stages.setdefault(stage, {'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'articles': 0})
+        totals['calls'] += 1
+        totals['seconds'] += duration
+        totals['max_seconds'] = max(totals['max_seconds'], duration)
+        totals['articles'] += articles
+
+    if METRICS_LOG_PATH:
+        with open(METRICS_LOG_PATH, 'a') as log_file:
+            log_file.write(json.dumps({'time': time.time(), 'stage': stage, 'seconds': duration, 'articles': articles}) + "\n")
+
+
+def record_cache(cache, hits=0, misses=0):
+    """
+    Records lookups against a cache.
+
+    Inputs:
+    - cache (str): The cache name.
+    - hits (int): The number of lookups answered from the cache.
+    - misses (int): The number of lookups that had to be computed.
+
+    Returns:
+    - None
+    """
+
+    with _lock:
+        totals = _caches.setdefault(cache, {'hits': 0, 'misses': 0})
+        totals['hits'] += hits
+        totals['misses'] += misses
+
+
+def _article_count(value):
+    """
+    Guesses how many articles a stage's input holds: the length of a DataFrame or list, or 1 for a single text.
+    """
+
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        return 1
+    try:
+        return len(value)
+    except TypeError:
+        return 1
+
+
+@contextmanager
+def timer(stage, articles=0):
+    """
+    Times the enclosed block as one call of a pipeline stage.
+
+    Inputs:
+    - stage (str): The stage name.
+    - articles (int): The number of articles the block handles.
+    """
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start, articles)
+
+
+def instrument(stage, count_result=False):
+    """
+    Decorates a pipeline function so every call is timed, counting the articles it handles.
+
+    Inputs:
+    - stage (str): The stage name.
+    - count_result (bool): Count the articles in the return value instead of in the first argument,
+      for functions that take a query and return articles.
+
+    Returns:
+    - callable: The decorator.
+    """
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            result = function(*args, **kwargs)
+
+            articles = _article_count(result) if count_result else _article_count(args[0]) if args else 0
+            record_stage(stage, time.perf_counter() - start, articles)
+            return result
+        return wrapper
+
+    return decorator
+
+
+def snapshot():
+    """
+    Returns a copy of the current metrics.
+
+    Returns:
+    - dict: A dictionary with 'stages' and 'caches' keys, each mapping a name to its totals.
+    """
+
+    with _lock:
+        return {
+            'stages': {stage: dict(totals) for stage, totals in _stages.items()},
+            'caches': {cache: dict(totals) for cache, totals in _caches.items()},
+        }
+
+
+def prometheus_text():
+    """
+    Renders the current metrics in the Prometheus text exposition format.
+
+    Returns:
+    - str: The metrics text.
+    """
+
+    metrics = snapshot()
+    lines = []
+
+    stage_metrics = [
+        ('stage_calls_total', 'counter', 'calls', 'Number of calls per pipeline stage.'),
+        ('stage_duration_seconds_total', 'counter', 'seconds', 'Total time spent per pipeline stage.'),
+        ('stage_duration_seconds_max', 'gauge', 'max_seconds', 'Slowest single call per pipeline stage.'),
+        ('stage_articles_total', 'counter', 'articles', 'Number of articles handled per pipeline stage.'),
+    ]
+    for name, metric_type, key, description in stage_metrics:
+        lines.append(f"# HELP {METRICS_PREFIX}_{name} {description}")
+        lines.append(f"# TYPE {METRICS_PREFIX}_{name} {metric_type}")
+        for stage, totals in sorted(metrics['stages'].items()):
+            lines.append(f'{METRICS_PREFIX}_{name}{{stage="{stage}"}} {totals[key]}')
+
+    lines.append(f"# HELP {METRICS_PREFIX}_cache_requests_total Number of cache lookups by result.")
+    lines.append(f"# TYPE {METRICS_PREFIX}_cache_requests_total counter")
+    for cache, totals in sorted(metrics['caches'].items()):
+        lines.append(f'{METRICS_PREFIX}_cache_requests_total{{cache="{cache}",result="hit"}} {totals["hits"]}')
+        lines.append(f'{METRICS_PREFIX}_cache_requests_total{{cache="{cache}",result="miss"}} {totals["misses"]}')
+
+    return "\n".join(lines) + "\n"
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """
+    Serves the metrics on /metrics in Prometheus format and on /metrics.json as JSON.
+    """
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, content_type = prometheus_text(), "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body, content_type = json.dumps(snapshot()), "application/json"
+        else:
+            self.send_error(404)
+            return
+
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port, host="0.0.0.0"):
+    """
+    Starts the metrics endpoint on a background thread, once per process.
+
+    Inputs:
+    - port (int): The port to listen on.
+    - host (str): The interface to listen on.
+
+    Returns:
+    - ThreadingHTTPServer: The running server.
+    """
+
+    global _server
+
+    with _lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), MetricsHandler)
+            threading.Thread(target=_server.serve_forever, daemon=True).start()
+
+    return _server
+
+
+@contextmanager
+def profile(enabled=True, output_path=None):
+    """
+    Profiles the enclosed block with cProfile and prints the most expensive functions.
+
+    Inputs:
+    - enabled (bool): Whether to profile at all, so callers can opt in per request.
+    - output_path (str): Where to also save the raw stats for snakeviz/pstats, if given.
+    """
+
+    if not enabled:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+
+        if output_path:
+            profiler.dump_stats(output_path)
+
+        report = io.StringIO()
+        pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(PROFILE_TOP_N)
+        print(report.getvalue())
@@ -0,0 +1,127 @@
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- Configuration ---
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8000
+DEFAULT_LATENCY = 0.0 # Seconds to wait before answering each request
+
+# Vocabulary for synthetic articles, mixing named entities with positive and negative words
+PEOPLE = ["Donald Trump", "Elon Musk", "Keir Starmer", "Joe Biden", "Rishi Sunak", "Emmanuel Macron", "Ursula von der Leyen", "Sam Altman"]
+ORGANIZATIONS = ["Apple", "Microsoft", "NATO", "the European Union", "Tesla", "OpenAI", "the Bank of England", "Reuters"]
+POSITIVE_WORDS = ["welcomes", "praises", "celebrates", "boosts", "agrees", "wins"]
+NEGATIVE_WORDS = ["slams", "warns", "rejects", "threatens", "loses", "condemns"]
+TOPICS = ["new tariffs", "trade talks", "an AI safety bill", "interest rates", "a merger", "election results", "a data breach"]
+
+
+def generate_articles(query_text, result_size, seed=None):
+    """
+    Generates synthetic search results in the same schema as the live API.
+
+    Inputs:
+    - query_text (str): The query being answered, mentioned in some summaries.
+    - result_size (int): The number of articles to generate.
+    - seed (int): Seed for the random generator, so runs can be repeated.
+
+    Returns:
+    - list: A list of article dictionaries with 'id', 'title', 'summary', 'score', 'timestamp', 'url' and 'highlights' keys.
+    """
+
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    articles = []
+
+    for i in range(result_size):
+        person = rng.choice(PEOPLE)
+        organization = rng.choice(ORGANIZATIONS)
+        verb = rng.choice(POSITIVE_WORDS + NEGATIVE_WORDS)
+        topic = rng.choice(TOPICS)
+
+        title = f"{person} {verb} {organization} over {topic}"
+        summary = (
+            f"{person} {verb} {organization} over {topic}, according to reports on {query_text}. "
+            f"Officials at {rng.choice(ORGANIZATIONS)} said {rng.choice(PEOPLE)} would respond later this week."
+        )
+
+        articles.append({
+            "id": f"mock-{rng.getrandbits(48):012x}",
+            "title": title,
+            "summary": summary,
+            "score": round(rng.random(), 4),
+            "timestamp": (now - timedelta(minutes=rng.randint(0, 60 * 24 * 30))).isoformat(),
+            "url": f"https://news.example.com/articles/{i}",
+            "highlights": [summary.split(". ")[0] + ".", f"{organization} declined to comment."],
+        })
+
+    return articles
+
+
+class MockSearchHandler(BaseHTTPRequestHandler):
+    """
+    Answers search requests with synthetic articles after the server's configured latency.
+    """
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b"{}")
+
+        time.sleep(self.server.latency)
+
+        results = generate_articles(body.get("query_text", ""), int(body.get("result_size", 20)), seed=self.server.seed)
+        data = json.dumps({"results": results}).encode("utf-8")
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # Keep benchmark output free of per-request logs
+        pass
+
+
+def start_server(host=DEFAULT_HOST, port=DEFAULT_PORT, latency=DEFAULT_LATENCY, seed=None):
+    """
+    Starts the mock search API on a background thread.
+
+    Inputs:
+    - host (str): The interface to listen on.
+    - port (int): The port to listen on, or 0 to pick a free one.
+    - latency (float): Seconds to wait before answering each request.
+    - seed (int): Seed for the generated articles, or None for different articles on each request.
+
+    Returns:
+    - ThreadingHTTPServer: The running server. Its URL is f"http://{host}:{server.server_port}/".
+    """
+
+    server = ThreadingHTTPServer((host, port), MockSearchHandler)
+    server.latency = latency
+    server.seed = seed
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# --- Main execution block for running the mock API on its own ---
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Serve synthetic articles in the search API's schema.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Interface to listen on.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to listen on.")
+    parser.add_argument("--latency", type=float, default=DEFAULT_LATENCY, help="Seconds to wait before answering each request.")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for the generated articles.")
+    args = parser.parse_args()
+
+    server = start_server(args.host, args.port, args.latency, args.seed)
+    print(f"Mock search API listening on http://{args.host}:{server.server_port}/ (set API_URL to this address)")
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -1,17 +1,94 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
 import pandas as pd
-import spacy
-import nltk
-from nltk.sentiment.vader import SentimentIntensityAnalyzer as SIA
 
-# Load the spaCy model for sentiment analysis and entity recognition
-spacy.cli.download("en_core_web_sm")
-nlp = spacy.load("en_core_web_sm")
+import metrics
+import store
+
+# spaCy model used for entity recognition
+SPACY_MODEL = "en_core_web_sm"
+
+# Pipeline components entity recognition doesn't need, excluded so they are never loaded
+SPACY_EXCLUDED_COMPONENTS = ["tagger", "parser", "attribute_ruler", "lemmatizer", "senter"]
+
+# Entity extraction trades accuracy for throughput: 'accurate' runs the model on every text,
+# 'balanced' only on texts the gazetteer can't fully tag, and 'fast' never. Listed best first,
+# so cached results from a mode earlier in the list can stand in for a later one
+NER_MODES = ("accurate", "balanced", "fast")
+NER_MODE = os.getenv("NER_MODE", "accurate")
+
+# Articles a name must have been found in before it seeds the gazetteer
+GAZETTEER_MIN_MENTIONS = 2
 
-# Download the VADER lexicon for sentiment analysis
-nltk.download("vader_lexicon")
+# A capitalized word the model has passed over this many times is taken not to be a name, so texts
+# containing it can skip the model; it must be seen again within the ttl to stay that way
+NON_ENTITY_MIN_SIGHTINGS = 3
+NON_ENTITY_TTL_SECONDS = 60 * 60
+NON_ENTITY_MAX_WORDS = 10_000
 
-# Initialize the VADER sentiment intensity analyzer
-sia = SIA()
+# Models are loaded on first use rather than at import time
+_nlp = None
+_sia = None
+
+def get_nlp():
+    """
+    Returns the shared spaCy pipeline, loading it with only the NER components on first use.
+    
+    Returns:
+    - spacy.language.Language: The loaded spaCy pipeline.
+    """
+
+    global _nlp
+
+    if _nlp is None:
+        import spacy
+
+        try:
+            _nlp = spacy.load(SPACY_MODEL, exclude=SPACY_EXCLUDED_COMPONENTS)
+        except OSError as e:
+            raise OSError(
+                f"spaCy model '{SPACY_MODEL}' is not installed. Install it with 'python -m spacy download {SPACY_MODEL}'."
+            ) from e
+
+    return _nlp
+
+def get_sia():
+    """
+    Returns the shared VADER sentiment intensity analyzer, creating it on first use.
+    
+    Returns:
+    - SentimentIntensityAnalyzer: The VADER analyzer.
+    """
+
+    global _sia
+
+    if _sia is None:
+        from nltk.sentiment.vader import SentimentIntensityAnalyzer as SIA
+
+        try:
+            _sia = SIA()
+        except LookupError as e:
+            raise LookupError(
+                "NLTK resource 'vader_lexicon' is not installed. Install it with 'python -m nltk.downloader vader_lexicon'."
+            ) from e
+
+    return _sia
+
+# Default batching for spaCy's nlp.pipe in entity extraction
+DEFAULT_BATCH_SIZE = 64
+DEFAULT_N_PROCESS = 1
+
+# Maximum number of distinct texts whose VADER scores are remembered
+SENTIMENT_CACHE_SIZE = 100_000
+
+# Sentiment groups, from very negative to very positive, stored as a categorical column
+SENTIMENT_CATEGORIES = [-2, -1, 0, 1, 2]
 
 def sentiment_category(score):
     """
@@ -28,27 +105,233 @@ def sentiment_category(score):
     else:
         return 2
 
-def analyze_sentiment(dataframe: pd.DataFrame):
+def sentiment_categories(scores):
+    """
+    Categorizes many VADER compound scores at once, using the same thresholds as sentiment_category.
+    
+    Inputs:
+    - scores (array-like): The compound scores.
+    
+    Returns:
+    - np.ndarray: The sentiment group (-2 to 2) of each score.
+    """
+
+    scores = np.asarray(scores, dtype=float)
+
+    # Each threshold passed moves the score up one group, matching sentiment_category's boundaries
+    return -2 + (scores > -0.6).astype(int) + (scores >= -0.2) + (scores > 0.2) + (scores >= 0.6)
+
+@lru_cache(maxsize=SENTIMENT_CACHE_SIZE)
+def compound_score(text):
+    """
+    Returns the VADER compound score of a text, remembering recent results.
+    """
+
+    return get_sia().polarity_scores(text)['compound']
+
+def score_texts(texts):
+    """
+    Scores many texts with VADER, scoring each distinct text only once.
+    
+    Inputs:
+    - texts (array-like): The texts to score. Missing or non-string values score 0.
+    
+    Returns:
+    - np.ndarray: The compound score of each text.
+    """
+
+    # Collapse duplicate texts (syndicated headlines, repeated loads) to one score each
+    codes, uniques = pd.factorize(pd.Series(texts, dtype=object))
+    unique_scores = np.array([compound_score(text) if isinstance(text, str) else 0.0 for text in uniques], dtype=float)
+
+    scores = np.zeros(len(codes))
+    present = codes >= 0
+    scores[present] = unique_scores[codes[present]]
+    return scores
+
+@metrics.instrument("analyze_sentiment")
+def analyze_sentiment(dataframe: pd.DataFrame, include_summary=False):
     """
     Analyses the sentiment of the 'title' column in the given DataFrame using VADER.
     
     Inputs:
     - dataframe (pd.DataFrame): A DataFrame containing a 'title' column with text data.
+    - include_summary (bool): Whether to also score the 'summary' column in the same pass.
+
+    Returns:
+    - None: The function modifies the DataFrame in place by adding 'sentiment' and 'sentiment_category' columns,
+      and a 'summary_sentiment' column if include_summary is set.
+    """
+
+    columns = ['title', 'summary'] if include_summary else ['title']
+
+    # Score all requested columns together so text shared between them is only scored once
+    scores = score_texts(pd.concat([dataframe[column] for column in columns], ignore_index=True))
+
+    dataframe['sentiment'] = scores[:len(dataframe)]
+    dataframe['sentiment_category'] = pd.Categorical(sentiment_categories(dataframe['sentiment']), categories=SENTIMENT_CATEGORIES)
+
+    if include_summary:
+        dataframe['summary_sentiment'] = scores[len(dataframe):]
+
+
+def _entities_from_doc(doc):
+    """
+    Collects the unique people and organizations from a processed spaCy document.
+    """
+
+    # Extract unique people
+    people = list(set([ent.text for ent in doc.ents if ent.label_ == 'PERSON']))
+
+    # Extract unique organizations
+    organizations = list(set([ent.text for ent in doc.ents if ent.label_ == 'ORG']))
+
+    # Return resulting lists
+    return {'people': people, 'organizations': organizations}
+
+class Gazetteer:
+    """
+    Fast entity tagging tier: known people and organizations are found with spaCy's PhraseMatcher,
+    and only texts with capitalized words it can't account for need the statistical model.
+    It learns new names, and capitalized words that aren't names, from every text the model processes.
+    Non-names are only trusted after repeated sightings and expire, so a name the model missed once
+    isn't hidden from it for good.
+    """
+
+    def __init__(self, nlp):
+        from spacy.matcher import PhraseMatcher
+
+        self.nlp = nlp
+        self.matcher = PhraseMatcher(nlp.vocab)
+        self.labels = {}
+        self.non_entity_words = OrderedDict() # word -> [sightings, last seen], least recently seen first
+        self._lock = threading.Lock()
+
+    def add(self, name, label):
+        """
+        Adds a name to the gazetteer under 'PERSON' or 'ORG', unless it is already known.
+        """
+
+        with self._lock:
+            if name in self.labels:
+                return
+            self.labels[name] = label
+            self.matcher.add(label, [self.nlp.make_doc(name)])
+
+            # Words of a known name are never treated as non-names
+            for word in name.split():
+                self.non_entity_words.pop(word, None)
+
+    def _is_non_entity(self, word, now):
+        """
+        Whether a word has been seen enough, recently enough, to be trusted not to be a name.
+        """
+
+        entry = self.non_entity_words.get(word)
+        return entry is not None and entry[0] >= NON_ENTITY_MIN_SIGHTINGS and now - entry[1] < NON_ENTITY_TTL_SECONDS
+
+    def match(self, text):
+        """
+        Tags the known names in a text.
+
+        Inputs:
+        - text (str): The text to tag.
+
+        Returns:
+        - tuple: The entities found, as a dictionary with 'people' and 'organizations' keys, and whether
+          the text has capitalized words that are neither known names nor known non-names.
+        """
+
+        from spacy.util import filter_spans
+
+        doc = self.nlp.make_doc(text)
+        now = time.monotonic()
+        with self._lock:
+            spans = filter_spans(self.matcher(doc, as_spans=True))
 
+            covered = set()
+            for span in spans:
+                covered.update(range(span.start, span.end))
+
+            # A capitalized word the gazetteer can't account for may be a name it hasn't seen yet
+            unknown = any(
+                token.is_alpha and token.text[0].isupper() and not token.is_stop
+                and token.i not in covered and not self._is_non_entity(token.text, now)
+                for token in doc
+            )
+
+        entities = {
+            'people': list({span.text for span in spans if span.label_ == 'PERSON'}),
+            'organizations': list({span.text for span in spans if span.label_ == 'ORG'}),
+        }
+        return entities, unknown
+
+    def learn(self, doc):
+        """
+        Learns from a document the statistical model has processed: its people and organizations become
+        known names, and its other capitalized words known non-names.
+        """
+
+        names = set()
+        for ent in doc.ents:
+            if ent.label_ in ('PERSON', 'ORG'):
+                self.add(ent.text, ent.label_)
+                names.update(range(ent.start, ent.end))
+
+        now = time.monotonic()
+        with self._lock:
+            for token in doc:
+                if not (token.is_alpha and token.text[0].isupper()) or token.i in names:
+                    continue
+
+                sightings = self.non_entity_words.pop(token.text, [0, now])[0]
+                self.non_entity_words[token.text] = [sightings + 1, now]
+
+            # Forget the least recently seen words beyond the limit
+            while len(self.non_entity_words) > NON_ENTITY_MAX_WORDS:
+                self.non_entity_words.popitem(last=False)
+
+_gazetteer = None
+_gazetteer_lock = threading.Lock()
+
+def get_gazetteer():
+    """
+    Returns the shared gazetteer, seeding it on first use with the entities already in the enrichment cache.
+    
     Returns:
-    - None: The function modifies the DataFrame in place by adding a 'sentiment' column.
+    - Gazetteer: The gazetteer.
+    """
+
+    global _gazetteer
+
+    with _gazetteer_lock:
+        if _gazetteer is None:
+            gazetteer = Gazetteer(get_nlp())
+            for name, label in store.known_entities(min_mentions=GAZETTEER_MIN_MENTIONS).items():
+                gazetteer.add(name, label)
+            _gazetteer = gazetteer
+
+    return _gazetteer
+
+def reset_gazetteer():
+    """
+    Forgets everything the gazetteer has learned, so the next use seeds it again from the enrichment cache.
     """
 
-    dataframe['sentiment'] = dataframe['title'].apply(lambda x: sia.polarity_scores(x)['compound'])
-    dataframe['sentiment_category'] = dataframe['sentiment'].apply(sentiment_category)
+    global _gazetteer
 
+    with _gazetteer_lock:
+        _gazetteer = None
 
-def extract_entities(text):
+def extract_entities(text, mode=None):
     """
     Extracts unique people and organizations from the given text using spaCy.
+
+    Timed as part of extract_entities_batch, which it delegates to.
     
     Inputs:
     - text (str): The input text from which to extract entities.
+    - mode (str): One of NER_MODES. Defaults to NER_MODE.
     
     Returns:
     - dict: A dictionary with two keys:
@@ -60,41 +343,155 @@ def extract_entities(text):
     if not isinstance(text, str) or not text.strip():
         return {'people': [], 'organizations': []}
 
-    # Process the text with spaCy
-    doc = nlp(text)
+    people, organizations = extract_entities_batch([text], mode=mode)
+    return {'people': people[0], 'organizations': organizations[0]}
 
-    # Extract unique people
-    people = list(set([ent.text for ent in doc.ents if ent.label_ == 'PERSON']))
+@metrics.instrument("extract_entities_batch")
+def extract_entities_batch(texts, batch_size=DEFAULT_BATCH_SIZE, n_process=DEFAULT_N_PROCESS, mode=None):
+    """
+    Extracts unique people and organizations from many texts at once.
+    
+    Inputs:
+    - texts (iterable of str): The input texts from which to extract entities.
+    - batch_size (int): The number of texts spaCy processes per batch.
+    - n_process (int): The number of worker processes to use (-1 for all cores).
+    - mode (str): One of NER_MODES. Defaults to NER_MODE.
+        - 'accurate': every text goes through the statistical model.
+        - 'balanced': the gazetteer tags known names, and only texts with unrecognized capitalized
+          words go through the model.
+        - 'fast': the gazetteer alone, so names it hasn't learned yet are missed.
+    
+    Returns:
+    - tuple: Two lists aligned with the input texts:
+        - The people found in each text.
+        - The organizations found in each text.
+    """
 
-    # Extract unique organizations
-    organizations = list(set([ent.text for ent in doc.ents if ent.label_ == 'ORG']))
+    mode = mode or NER_MODE
+    if mode not in NER_MODES:
+        raise ValueError(f"Unknown NER mode '{mode}'; expected one of {', '.join(NER_MODES)}.")
 
-    # Return resulting lists
-    return {'people': people, 'organizations': organizations}
+    # Non-string or empty texts still take a slot so the output stays aligned with the input
+    texts = [text if isinstance(text, str) and text.strip() else "" for text in texts]
+    results = [None] * len(texts)
+
+    if mode == 'accurate':
+        for position, doc in enumerate(get_nlp().pipe(texts, batch_size=batch_size, n_process=n_process)):
+            results[position] = _entities_from_doc(doc)
+    else:
+        gazetteer = get_gazetteer()
+
+        # In a single process, texts are tagged a batch at a time so names the model finds in one batch
+        # are known for the next; worker processes are only started once, for all the texts at the end
+        chunk_size = batch_size if n_process == 1 else max(len(texts), 1)
+        model_count = 0
+        for start in range(0, len(texts), chunk_size):
+            # Tag known names first, leaving the texts the gazetteer can't vouch for to the model
+            model_positions = []
+            for position in range(start, min(start + chunk_size, len(texts))):
+                entities, unknown = gazetteer.match(texts[position])
+                if unknown and mode == 'balanced':
+                    model_positions.append(position)
+                else:
+                    results[position] = entities
 
-def package_articles_with_sentiment_info(dataframe: pd.DataFrame):
+            model_texts = [texts[position] for position in model_positions]
+            for position, doc in zip(model_positions, get_nlp().pipe(model_texts, batch_size=batch_size, n_process=n_process)):
+                results[position] = _entities_from_doc(doc)
+                gazetteer.learn(doc)
+            model_count += len(model_positions)
+
+        metrics.record_cache("gazetteer", hits=len(texts) - model_count, misses=model_count)
+
+    return [entities['people'] for entities in results], [entities['organizations'] for entities in results]
+
+def content_hash(title, summary):
+    """
+    Hashes an article's title and summary so changed text invalidates its cached enrichment.
+    
+    Inputs:
+    - title (str): The article title.
+    - summary (str): The article summary.
+    
+    Returns:
+    - str: A hex digest of the text.
+    """
+
+    return hashlib.sha1(f"{title}\x1f{summary}".encode("utf-8")).hexdigest()
+
+@metrics.instrument("package_articles_with_sentiment_info")
+def package_articles_with_sentiment_info(dataframe: pd.DataFrame, batch_size=DEFAULT_BATCH_SIZE, n_process=DEFAULT_N_PROCESS, use_cache=True, ner_mode=None):
     """
     Packages articles with sentiment analysis and entity extraction.
     
     Inputs:
     - dataframe (pd.DataFrame): A DataFrame containing a 'title' and 'summary' column with text data.
+    - batch_size (int): The number of summaries spaCy processes per batch.
+    - n_process (int): The number of worker processes to use for entity extraction (-1 for all cores).
+    - use_cache (bool): Whether to reuse and save results in the article store's enrichment cache.
+    - ner_mode (str): The entity extraction mode, one of NER_MODES. Defaults to NER_MODE.
     
     Returns:
     - None: The function modifies the DataFrame in place by adding 'sentiment', 'people', and 'organizations' columns.
     """
 
-    analyze_sentiment(dataframe)
+    ner_mode = ner_mode or NER_MODE
+    if ner_mode not in NER_MODES:
+        raise ValueError(f"Unknown NER mode '{ner_mode}'; expected one of {', '.join(NER_MODES)}.")
+
+    # Key every article by id plus a hash of its text
+    if 'id' in dataframe.columns:
+        ids = [store.normalise_id(article_id) for article_id in dataframe['id']]
+    else:
+        ids = [None] * len(dataframe)
+    hashes = [content_hash(title, summary) for title, summary in zip(dataframe['title'], dataframe['summary'])]
+
+    # Reuse cached results whose text hasn't changed and whose entities came from a mode at least as thorough
+    cached = store.get_enrichments({article_id for article_id in ids if article_id is not None}) if use_cache else {}
+    enrichments = []
+    for article_id, text_hash in zip(ids, hashes):
+        enrichment = cached.get(article_id)
+        reusable = (
+            enrichment is not None and enrichment['content_hash'] == text_hash
+            and NER_MODES.index(enrichment['ner_mode']) <= NER_MODES.index(ner_mode)
+        )
+        enrichments.append(enrichment if reusable else None)
 
-    dataframe['people'] = pd.Series(dtype=object)
-    dataframe['organizations'] = pd.Series(dtype=object)
+    # Only articles without a cached result go through VADER and spaCy
+    misses = [position for position, enrichment in enumerate(enrichments) if enrichment is None]
+    if use_cache:
+        metrics.record_cache("enrichments", hits=len(enrichments) - len(misses), misses=len(misses))
+    if misses:
+        missing_df = dataframe.iloc[misses][['title', 'summary']].copy()
+        analyze_sentiment(missing_df)
 
-    for index, row in dataframe.iterrows():
-        entities = extract_entities(row['summary'])
+        # Run NER over the summaries in batches
+        people, organizations = extract_entities_batch(missing_df['summary'], batch_size=batch_size, n_process=n_process, mode=ner_mode)
 
+        new_enrichments = {}
+        for i, position in enumerate(misses):
+            enrichments[position] = {
+                'content_hash': hashes[position],
+                'ner_mode': ner_mode,
+                'sentiment': float(missing_df['sentiment'].iloc[i]),
+                'sentiment_category': int(missing_df['sentiment_category'].iloc[i]),
+                'people': people[i],
+                'organizations': organizations[i],
+            }
+            if ids[position] is not None:
+                new_enrichments[ids[position]] = enrichments[position]
 
-        dataframe.at[index, 'people'] = entities['people']
-        dataframe.at[index, 'organizations'] = entities['organizations']
+        if use_cache and new_enrichments:
+            store.save_enrichments(new_enrichments)
+
+    # Assign the columns in bulk
+    dataframe['sentiment'] = [enrichment['sentiment'] for enrichment in enrichments]
+    dataframe['sentiment_category'] = pd.Categorical([enrichment['sentiment_category'] for enrichment in enrichments], categories=SENTIMENT_CATEGORIES)
+    dataframe['people'] = pd.Series([enrichment['people'] for enrichment in enrichments], index=dataframe.index, dtype=object)
+    dataframe['organizations'] = pd.Series([enrichment['organizations'] for enrichment in enrichments], index=dataframe.index, dtype=object)
 
 def update_vader_lexicon():
+    import nltk
+
     nltk.download("vader_lexicon")
 
@@ -0,0 +1,55 @@
+import threading
+from concurrent.futures import Future
+
+import metrics
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key: the first caller runs the function and every caller
+    that arrives while it is running waits for and shares its result (or exception).
+
+    Results are shared between callers, so they must be treated as read-only.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, function, *args, **kwargs):
+        """
+        Runs a function once for all concurrent callers with the same key.
+
+        Inputs:
+        - key (hashable): Identifies calls that can share a result.
+        - function (callable): The function to run, called with the remaining arguments.
+
+        Returns:
+        - The function's result.
+        """
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+
+        # Followers wait on the call already in flight
+        if not leader:
+            metrics.record_cache(self.name, hits=1)
+            return call.result()
+
+        metrics.record_cache(self.name, misses=1)
+        try:
+            result = function(*args, **kwargs)
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            # Later callers start a fresh call, so they never see an old result
+            with self._lock:
+                del self._calls[key]
@@ -0,0 +1,558 @@
+import json
+import os
+from collections import Counter
+import re
+import sqlite3
+import time
+from contextlib import closing
+
+import pandas as pd
+import pyarrow as pa
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- Configuration ---
+STORE_PATH = os.getenv("ARTICLE_STORE_PATH", "articles.db")
+
+# Total size of the cached frames kept in the store, least recently used evicted first
+FRAME_CACHE_MAX_BYTES = int(os.getenv("FRAME_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# SQLite caps the number of bound parameters per statement, so large id lookups are chunked
+MAX_QUERY_PARAMETERS = 900
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    id TEXT PRIMARY KEY,
+    timestamp TEXT,
+    data TEXT NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(
+    title, summary, highlights, tokenize = 'porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS articles_fts_insert AFTER INSERT ON articles BEGIN
+    INSERT INTO articles_fts (rowid, title, summary, highlights) VALUES (
+        new.rowid, json_extract(new.data, '$.title'), json_extract(new.data, '$.summary'),
+        (SELECT group_concat(value, ' ') FROM json_each(new.data, '$.highlights'))
+    );
+END;
+CREATE TRIGGER IF NOT EXISTS articles_fts_update AFTER UPDATE OF data ON articles BEGIN
+    DELETE FROM articles_fts WHERE rowid = old.rowid;
+    INSERT INTO articles_fts (rowid, title, summary, highlights) VALUES (
+        new.rowid, json_extract(new.data, '$.title'), json_extract(new.data, '$.summary'),
+        (SELECT group_concat(value, ' ') FROM json_each(new.data, '$.highlights'))
+    );
+END;
+CREATE TABLE IF NOT EXISTS query_articles (
+    query_text TEXT NOT NULL,
+    id TEXT NOT NULL,
+    timestamp TEXT,
+    aggregated INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (query_text, id)
+);
+CREATE INDEX IF NOT EXISTS idx_query_articles_query_timestamp
+    ON query_articles (query_text, timestamp DESC);
+CREATE TABLE IF NOT EXISTS sentiment_buckets (
+    query_text TEXT NOT NULL,
+    bucket_seconds INTEGER NOT NULL,
+    bucket_start INTEGER NOT NULL,
+    sentiment_sum REAL NOT NULL,
+    article_count INTEGER NOT NULL,
+    PRIMARY KEY (query_text, bucket_seconds, bucket_start)
+);
+CREATE TABLE IF NOT EXISTS query_fetches (
+    query_text TEXT PRIMARY KEY,
+    fetched_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS frames (
+    key TEXT PRIMARY KEY,
+    data BLOB NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    expires_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS enrichments (
+    id TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    ner_mode TEXT NOT NULL,
+    sentiment REAL,
+    sentiment_category INTEGER,
+    people TEXT,
+    organizations TEXT
+);
+"""
+
+
+# Bumped whenever SCHEMA changes, so existing stores are set up again
+SCHEMA_VERSION = 1
+
+# Relative weight of matches in the title, summary and highlights when ranking search results
+SEARCH_WEIGHTS = (10.0, 5.0, 1.0)
+
+_SEARCH_TERM_PATTERN = re.compile(r"\w+")
+
+
+def connect(path=None):
+    """
+    Opens a connection to the local article store, creating the schema the first time the file is opened.
+
+    Inputs:
+    - path (str): Path to the SQLite database file. Defaults to STORE_PATH.
+
+    Returns:
+    - sqlite3.Connection: An open connection to the store.
+    """
+
+    connection = sqlite3.connect(path or STORE_PATH, timeout=30)
+
+    # The schema version is kept in the file itself, so setup runs once per database rather than per connection
+    if connection.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+        _set_up(connection)
+
+    return connection
+
+
+def _set_up(connection):
+    """
+    Creates the schema. Every step is safe to repeat, so processes opening a new store at the same time don't conflict.
+    """
+
+    # WAL lets readers carry on while another process is writing, and stays set on the file
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.executescript(SCHEMA)
+    connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+
+def normalise_id(value):
+    """
+    Converts an article id into the string key used by the store, or None if it is missing.
+
+    Inputs:
+    - value: The raw id, which pandas may have turned into a float.
+
+    Returns:
+    - str: The normalised id, or None.
+    """
+
+    if value is None or pd.isna(value):
+        return None
+
+    # Ids read back through a column containing NaN come out as floats (e.g. 12.0)
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+def normalise_query(query_text):
+    """
+    Normalises a query so searches differing only in case or whitespace share stored results.
+
+    Inputs:
+    - query_text (str): The query as typed.
+
+    Returns:
+    - str: The query lower-cased, with runs of whitespace collapsed to single spaces.
+    """
+
+    return " ".join(query_text.split()).casefold()
+
+
+def distinct_queries(queries):
+    """
+    Drops queries that only differ from an earlier one in case or whitespace.
+
+    Inputs:
+    - queries (iterable of str): The queries as typed.
+
+    Returns:
+    - list: The first form given of each distinct query, in order.
+    """
+
+    distinct = {}
+    for query_text in queries:
+        distinct.setdefault(normalise_query(query_text), query_text)
+    return list(distinct.values())
+
+
+def _normalise_timestamp(value):
+    """
+    Converts a raw timestamp into a sortable UTC ISO-8601 string, or None if it can't be parsed.
+    """
+
+    timestamp = pd.to_datetime(value, errors='coerce', utc=True)
+    if pd.isna(timestamp):
+        return None
+    return timestamp.isoformat()
+
+
+def upsert_articles(query_text, dataframe: pd.DataFrame, path=None):
+    """
+    Inserts or updates articles in the store and records that they matched the given query.
+
+    Inputs:
+    - query_text (str): The query the articles were retrieved for.
+    - dataframe (pd.DataFrame): A DataFrame of articles with at least an 'id' column.
+    - path (str): Path to the SQLite database file. Defaults to STORE_PATH.
+
+    Returns:
+    - int: The number of articles written.
+    """
+
+    if dataframe.empty or 'id' not in dataframe.columns:
+        return 0
+
+    # Round-trip through JSON so numpy/pandas values become plain Python types
+    records = json.loads(dataframe.drop(columns=['query_text'], errors='ignore').to_json(orient='records', date_format='iso'))
+
+    article_rows = []
+    query_rows = []
+    for record in records:
+        article_id = normalise_id(record['id'])
+        if article_id is None:
+            continue
+
+        timestamp = _normalise_timestamp(record.get('timestamp'))
+        article_rows.append((article_id, timestamp, json.dumps(record)))
+        query_rows.append((query_text, article_id, timestamp))
+
+    if not article_rows:
+        return 0
+
+    with closing(connect(path)) as connection, connection:
+        connection.executemany(
+            "INSERT INTO articles (id, timestamp, data) VALUES (?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET timestamp = excluded.timestamp, data = excluded.data",
+            article_rows,
+        )
+        connection.executemany(
+            "INSERT INTO query_articles (query_text, id, timestamp) VALUES (?, ?, ?) "
+            "ON CONFLICT(query_text, id) DO UPDATE SET timestamp = excluded.timestamp",
+            query_rows,
+        )
+
+    return len(article_rows)
+
+
+def known_ids(query_text, article_ids, aggregated=False, path=None):
+    """
+    Finds which of the given articles are already stored for a query.
+
+    Inputs:
+    - query_text (str): The query to check against.
+    - article_ids (iterable of str): The ids to look up.
+    - aggregated (bool): Only count articles already added to the query's sentiment aggregates.
+    - path (str): Path to the SQLite database file. Defaults to STORE_PATH.
+
+    Returns:
+    - set: The ids already recorded for the query.
+    """
+
+    article_ids = list(article_ids)
+    known = set()
+
+    with closing(connect(path)) as connection:
+        for start in range(0, len(article_ids), MAX_QUERY_PARAMETERS):
+            chunk = article_ids[start:start + MAX_QUERY_PARAMETERS]
+            placeholders = ", ".join("?" * len(chunk))
+            rows = connection.execute(
+                f"SELECT id FROM query_articles WHERE query_text = ? AND id IN ({placeholders})"
+                + (" AND aggregated = 1" if aggregated else ""),
+                [query_text, *chunk],
+            ).fetchall()
+            known.update(article_id for (article_id,) in rows)
+
+    return known
+
+
+def latest_articles(query_text, limit, path=None):
+    """
+    Retrieves the most recent articles stored for a query, newest first.
+
+    Inputs:
+    - query_text (str): The query to look up.
+    - limit (int): The maximum number of articles to return.
+    - path (str): Path to the SQLite database file. Defaults to STORE_PATH.
+
+    Returns:
+    - pd.DataFrame: The stored articles with a 'query_text' column, or an empty DataFrame.
+    """
+
+    # Walks the (query_text, timestamp) index, so only the returned rows are touched
+    with closing(connect(path)) as connection:
+        rows = connection.execute(
+            "SELECT a.data FROM query_articles q JOIN articles a ON a.id = q.id "
+            "WHERE q.query_text = ? ORDER BY q.timestamp DESC LIMIT ?",
+            (query_text, limit),
+        ).fetchall()
+
+    if not rows:
+        return pd.DataFrame()
+
+    dataframe = pd.DataFrame([json.loads(data) for (data,) in rows])
+    dataframe['query_text'] = query_text
+    return dataframe
+
+
+def mark_fetched(query_text, fetched_at=None, path=None):
+    """
+    Records when a query's results were last fetched from the live API.
+
+    Inputs:
+    - query_text (str): The query that was fetched.
+    - fetched_at (float): The Unix time of the fetch. Defaults to now.
+    - path (str): Path to the SQLite database file. Defaults to STORE_PATH.
+
+    Returns:
+    - None
+    """
+
+    with closing(connect(path)) as connection, connection:
+        connection.execute(
+            "INSERT INTO query_fetches (query_text, fetched_at) VALUES (?, ?) "
+            "ON CONFLICT(query_text) DO UPDATE SET fetched_at = excluded.fetched_at",
+            (query_text, fetched_at if fetched_at is not None else time.time()),
+        )
+
+
+def last_fetched(query_text, path=None):
+    """
+    Looks up when a query's results were last fetched from the live API.
+
+    Inputs:
+    - query_text (str): The query to look up.
+    - path (str): Path to the SQLite database file. Defaults to STORE_PATH.
+
+    Returns:
+    - float: The Unix time of the last fetch, or None if it has never been fetched.
+    """
+
+    with closing(connect(path)) as connection:
+        row = connection.execute("SELECT fetched_at FROM query_fetches WHERE query_text = ?", (query_text,)).fetchone()
+
+    return row[0] if row else None
+
+
+def search_articles(query_text, limit, path=None):
+    """
+    Searches every stored article's title, summary and highlights, best matches first.
+
+    Inputs:
+    - query_text (str): The search terms. Articles must contain every term (after stemming).
+    - limit (int): The maximum number of articles to return.
+    - path (str): Path to the SQLite database file. Defaults to STORE_PATH.
+
+    Returns:
+    - pd.DataFrame: The matching articles as they were stored, ranked by BM25, or an empty DataFrame.
+    """
+
+    # Each term is quoted so FTS5 operators and punctuation in the query are matched literally
+    terms = _SEARCH_TERM_PATTERN.findall(query_text)
+    if not terms:
+        return pd.DataFrame()
+    match = " ".join(f'"{term}"' for term in terms)
+
+    with closing(connect(path)) as connection:
+        rows = connection.execute(
+            "SELECT a.data FROM articles_fts f JOIN articles a ON a.rowid = f.rowid "
+            "WHERE articles_fts MATCH ? ORDER BY bm25(articles_fts, ?, ?, ?) LIMIT ?",
+            (match, *SEARCH_WEIGHTS, limit),
+        ).fetchall()
+
+    if not rows:
+        return pd.DataFrame()
+
+    return pd.DataFrame([json.loads(data) for (data,) in rows])
+
+
+def get_article(article_id, path=None):
+    """
+    Retrieves one stored article.
+
+    Inputs:
+    - article_id (str): The id of the article.
+    - path (str): Path to the SQLite database file. Defaults to STORE_PATH.
+
+    Returns:
+    - dict: The article as it was stored, or None if it isn't in the store.
+    """
+
+    with closing(connect(path)) as connection:
+        row = connection.execute("SELECT data FROM articles WHERE id = ?", (normalise_id(article_id),)).fetchone()
+
+    return json.loads(row[0]) if row else None
+
+
+def get_enrichments(article_ids, path=None):
+    """
+    Retrieves stored sentiment and entity results for the given articles.
+
+    Inputs:
+    - article_ids (iterable of str): The ids of the articles to look up.
+    - path (str): Path to the SQLite database file. Defaults to STORE_PATH.
+
+    Returns:
+    - dict: A mapping of article id to a dictionary with 'content_hash', 'ner_mode', 'sentiment',
+      'sentiment_category', 'people' and 'organizations' keys. Unknown ids are omitted.
+    """
+
+    article_ids = list(article_ids)
+    enrichments = {}
+
+    with closing(connect(path)) as connection:
+        for start in range(0, len(article_ids), MAX_QUERY_PARAMETERS):
+            chunk = article_ids[start:start + MAX_QUERY_PARAMETERS]
+            placeholders = ", ".join("?" * len(chunk))
+            rows = connection.execute(
+                "SELECT id, content_hash, ner_mode, sentiment, sentiment_category, people, organizations "
+                f"FROM enrichments WHERE id IN ({placeholders})",
+                chunk,
+            ).fetchall()
+
+            for article_id, content_hash, ner_mode, sentiment, category, people, organizations in rows:
+                enrichments[article_id] = {
+                    'content_hash': content_hash,
+                    'ner_mode': ner_mode,
+                    'sentiment': sentiment,
+                    'sentiment_category': category,
+                    'people': json.loads(people),
+                    'organizations': json.loads(organizations),
+                }
+
+    return enrichments
+
+
+def known_entities(min_mentions=1, path=None):
+    """
+    Lists the people and organizations found in previously enriched articles.
+
+    Inputs:
+    - min_mentions (int): Only include names found in at least this many articles.
+    - path (str): Path to the SQLite database file. Defaults to STORE_PATH.
+
+    Returns:
+    - dict: A mapping of name to 'PERSON' or 'ORG', whichever it was found as most often.
+    """
+
+    counts = Counter()
+    with closing(connect(path)) as connection:
+        for people, organizations in connection.execute("SELECT people, organizations FROM enrichments"):
+            counts.update((name, 'PERSON') for name in json.loads(people))
+            counts.update((name, 'ORG') for name in json.loads(organizations))
+
+    # Names found as both a person and an organization keep their most frequent label
+    labels = {}
+    totals = Counter()
+    for (name, label), count in counts.most_common():
+        totals[name] += count
+        labels.setdefault(name, label)
+
+    return {name: label for name, label in labels.items() if totals[name] >= min_mentions}
+
+
+def save_enrichments(enrichments, path=None):
+    """
+    Inserts or replaces stored sentiment and entity results.
+
+    Inputs:
+    - enrichments (dict): A mapping of article id to a dictionary with 'content_hash', 'ner_mode', 'sentiment',
+      'sentiment_category', 'people' and 'organizations' keys.
+    - path (str): Path to the SQLite database file. Defaults to STORE_PATH.
+
+    Returns:
+    - int: The number of enrichments written.
+    """
+
+    rows = [
+        (
+            article_id,
+            enrichment['content_hash'],
+            enrichment['ner_mode'],
+            enrichment['sentiment'],
+            enrichment['sentiment_category'],
+            json.dumps(enrichment['people']),
+            json.dumps(enrichment['organizations']),
+        )
+        for article_id, enrichment in enrichments.items()
+    ]
+
+    with closing(connect(path)) as connection, connection:
+        connection.executemany(
+            "INSERT OR REPLACE INTO enrichments (id, content_hash, ner_mode, sentiment, sentiment_category, people, organizations) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+
+    return len(rows)
+
+
+def put_frame(key, dataframe: pd.DataFrame, ttl, max_bytes=None, path=None):
+    """
+    Caches a DataFrame in the store so every process on the host can reuse it until it expires.
+
+    Inputs:
+    - key (str): The cache key.
+    - dataframe (pd.DataFrame): The frame to cache. It must be convertible to Arrow.
+    - ttl (float): Seconds until the cached frame expires.
+    - max_bytes (int): The total size of cached frames to keep. Defaults to FRAME_CACHE_MAX_BYTES.
+    - path (str): Path to the SQLite database file. Defaults to STORE_PATH.
+
+    Returns:
+    - bool: Whether the frame was cached. Frames Arrow can't represent (e.g. mixed-type columns) are skipped.
+    """
+
+    # Serialise to the Arrow IPC format, which reads back with dtypes, time zones and index intact
+    try:
+        table = pa.Table.from_pandas(dataframe)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return False
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    data = sink.getvalue().to_pybytes()
+
+    now = time.time()
+    max_bytes = FRAME_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+
+    # One transaction, so other processes see either the old entry or the complete new one
+    with closing(connect(path)) as connection, connection:
+        connection.execute("DELETE FROM frames WHERE expires_at <= ?", (now,))
+        connection.execute(
+            "INSERT OR REPLACE INTO frames (key, data, size_bytes, expires_at, last_used) VALUES (?, ?, ?, ?, ?)",
+            (key, data, len(data), now + ttl, now),
+        )
+
+        # Keep the most recently used frames that fit in the budget and evict the rest
+        connection.execute(
+            "DELETE FROM frames WHERE key IN ("
+            "SELECT key FROM (SELECT key, SUM(size_bytes) OVER (ORDER BY last_used DESC, key) AS kept_bytes FROM frames) "
+            "WHERE kept_bytes > ?)",
+            (max_bytes,),
+        )
+
+    return True
+
+
+def get_frame(key, path=None):
+    """
+    Retrieves a cached DataFrame if it hasn't expired.
+
+    Inputs:
+    - key (str): The cache key.
+    - path (str): Path to the SQLite database file. Defaults to STORE_PATH.
+
+    Returns:
+    - pd.DataFrame: The cached frame, or None if there is no live entry for the key.
+    """
+
+    now = time.time()
+
+    with closing(connect(path)) as connection, connection:
+        row = connection.execute("SELECT data FROM frames WHERE key = ? AND expires_at > ?", (key, now)).fetchone()
+        if row is None:
+            return None
+
+        # Recently read frames are the last to be evicted
+        connection.execute("UPDATE frames SET last_used = ? WHERE key = ?", (now, key))
+
+    return pa.ipc.open_stream(row[0]).read_all().to_pandas()
@@ -0,0 +1,45 @@
+import pandas as pd
+import pytest
+
+import dataset
+import store
+
+
+@pytest.fixture(autouse=True)
+def temporary_store(tmp_path, monkeypatch):
+    # Every test gets its own article store and dataset directory
+    monkeypatch.setattr(store, "STORE_PATH", str(tmp_path / "articles.db"))
+    monkeypatch.setattr(dataset, "DATASET_PATH", str(tmp_path / "enriched"))
+    return tmp_path
+
+
+@pytest.fixture
+def fake_enrich():
+    # Stands in for package_articles_with_sentiment_info without loading VADER or spaCy
+    def enrich(df, **kwargs):
+        df['sentiment'] = 0.5
+        df['sentiment_category'] = 1
+        df['people'] = [[] for _ in range(len(df))]
+        df['organizations'] = [[] for _ in range(len(df))]
+        return df
+
+    return enrich
+
+
+@pytest.fixture
+def fake_fetch():
+    # Stands in for fetch_and_process_data: two articles, or none for the query "nothing"
+    def fetch(query_text, result_size, timeout=None):
+        if query_text == "nothing":
+            return pd.DataFrame()
+        return pd.DataFrame({
+            'id': ["a1", "a2"],
+            'title': ["First", "Second"],
+            'summary': ["First story.", "Second story."],
+            'score': [0.9, 0.8],
+            'timestamp': ["2026-10-01T09:00:00Z", "2026-10-01T10:00:00Z"],
+            'url': ["https://example.com/1", "https://example.com/2"],
+            'highlights': [["First story."], ["Second story."]],
+        })
+
+    return fetch
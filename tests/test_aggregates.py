@@ -0,0 +1,41 @@
+from datetime import timedelta
+
+import pandas as pd
+
+import aggregates
+import collector
+import store
+
+
+def test_collector_aggregates_articles_the_dashboard_stored_first(monkeypatch, fake_fetch, fake_enrich):
+    monkeypatch.setattr(collector, "package_articles_with_sentiment_info", fake_enrich)
+    articles = fake_fetch("cake recipes", 2)
+
+    # The dashboard's fetch stores the articles without aggregating them
+    store.upsert_articles("cake recipes", articles)
+    assert aggregates.load_sentiment_trend("cake recipes", timedelta(hours=1)).empty
+
+    assert collector.collect_query("cake recipes", articles.copy()) == 2
+    trend = aggregates.load_sentiment_trend("cake recipes", timedelta(hours=1))
+    assert trend.tolist() == [0.5, 0.5]
+
+    # Seeing the same articles again doesn't count them twice
+    assert collector.collect_query("cake recipes", articles.copy()) == 0
+    assert aggregates.update_aggregates("cake recipes", fake_enrich(articles.copy())) == 0
+
+
+def test_resampled_trend_matches_the_stored_buckets(fake_fetch, fake_enrich):
+    articles = fake_enrich(fake_fetch("cake recipes", 2))
+    articles['timestamp'] = pd.to_datetime(["2026-10-01T09:00:00Z", "2026-10-03T10:00:00Z"], utc=True)
+    articles['sentiment'] = [0.5, -0.5]
+    articles['copies'] = [3, 1]
+
+    # The stored buckets count every syndicated copy, as the collector stores each one
+    copies = articles.loc[articles.index.repeat(articles['copies'])].assign(id=[f"c{i}" for i in range(4)])
+    store.upsert_articles("cake recipes", copies)
+    aggregates.update_aggregates("cake recipes", copies)
+
+    for bucket_size in aggregates.BUCKET_SIZES:
+        stored = aggregates.load_sentiment_trend("cake recipes", bucket_size)
+        resampled = aggregates.resample_sentiment(articles, bucket_size)
+        pd.testing.assert_series_equal(resampled, stored, check_freq=False, check_index_type=False)
@@ -0,0 +1,40 @@
+import batch
+import fetch
+import store
+
+
+def test_run_batch_skips_queries_without_results(monkeypatch, fake_fetch, fake_enrich):
+    monkeypatch.setattr(fetch, "fetch_and_process_data", fake_fetch)
+    monkeypatch.setattr(batch, "package_articles_with_sentiment_info", fake_enrich)
+
+    written = batch.run_batch(["nothing", "cake recipes"])
+
+    assert written == {"nothing": 0, "cake recipes": 2}
+    assert len(store.latest_articles("cake recipes", 10)) == 2
+
+
+def test_fetch_many_grows_the_connection_pool(monkeypatch, fake_fetch):
+    monkeypatch.setattr(fetch, "fetch_and_process_data", fake_fetch)
+
+    results = fetch.fetch_many([("nothing", 10), ("cake recipes", 10)], max_concurrency=32)
+
+    assert [len(df) for df in results] == [0, 2]
+    assert fetch.session.get_adapter("https://example.com")._pool_maxsize == 32
+
+
+def test_queries_are_sent_as_typed_and_stored_normalised(monkeypatch, fake_fetch, fake_enrich):
+    calls = []
+
+    def recording_fetch(query_text, result_size, timeout=None):
+        calls.append(query_text)
+        return fake_fetch(query_text, result_size)
+
+    monkeypatch.setattr(fetch, "fetch_and_process_data", recording_fetch)
+    monkeypatch.setattr(batch, "package_articles_with_sentiment_info", fake_enrich)
+
+    queries = batch.read_queries(["Cake Recipes", "cake  recipes", "Bread"])
+    batch.run_batch(queries)
+
+    assert queries == ["Cake Recipes", "Bread"]
+    assert sorted(calls) == ["Bread", "Cake Recipes"]
+    assert len(store.latest_articles("cake recipes", 10)) == 2
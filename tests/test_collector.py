@@ -0,0 +1,40 @@
+import pandas as pd
+
+import collector
+import store
+
+
+def test_collector_sends_queries_as_typed(monkeypatch, fake_fetch, fake_enrich):
+    calls = []
+
+    def recording_stream(query_text, result_size, chunk_size):
+        calls.append(query_text)
+        yield fake_fetch(query_text, result_size)
+
+    monkeypatch.setattr(collector, "iter_fetch_and_process_data", recording_stream)
+    monkeypatch.setattr(collector, "package_articles_with_sentiment_info", fake_enrich)
+
+    collector.run_collector(["Cake Recipes", "cake  recipes"], interval=60, jitter=0, duration=0.5)
+
+    assert calls == ["Cake Recipes"]
+    assert len(store.latest_articles("cake recipes", 10)) == 2
+    assert store.last_fetched("cake recipes") is not None
+
+
+def test_collector_enriches_syndicated_copies_once(monkeypatch, fake_fetch, fake_enrich):
+    enriched = []
+
+    def counting_enrich(df, **kwargs):
+        enriched.extend(df['id'])
+        return fake_enrich(df)
+
+    monkeypatch.setattr(collector, "package_articles_with_sentiment_info", counting_enrich)
+    articles = fake_fetch("cake recipes", 10)
+    copy = articles.iloc[[0]].assign(id="a3", url="https://example.org/1")
+
+    collector.collect_query("cake recipes", pd.concat([articles, copy], ignore_index=True))
+
+    assert enriched == ["a1", "a2"]
+    stored = store.latest_articles("cake recipes", 10).set_index('id')
+    assert sorted(stored.index) == ["a1", "a2", "a3"]
+    assert stored.loc["a3", 'sentiment'] == stored.loc["a1", 'sentiment']
@@ -0,0 +1,43 @@
+import pandas as pd
+
+from dedup import cluster_labels, collapse_duplicates, enrich_stories
+
+WORDS = [f"item{i}" for i in range(200)]
+
+
+def test_similarity_is_not_chained():
+    # A and B share most of their words, as do B and C, but A and C share under a third
+    a, b, c = (" ".join(WORDS[start:start + 100]) for start in (0, 30, 60))
+
+    labels = cluster_labels([a, b, c])
+
+    assert labels.tolist() == [0, 0, 2]
+
+
+def test_collapse_duplicates_counts_copies():
+    story = " ".join(WORDS[:40])
+    df = pd.DataFrame({'title': ["Story", "Story", "Other"], 'summary': [story, story, " ".join(WORDS[100:140])]})
+
+    collapsed = collapse_duplicates(df)
+
+    assert collapsed.index.tolist() == [0, 2]
+    assert collapsed['copies'].tolist() == [2, 1]
+
+
+def test_enrich_stories_analyses_each_story_once():
+    story = " ".join(WORDS[:40])
+    df = pd.DataFrame({
+        'id': ["a", "b", "c"],
+        'title': ["Story", "Other", "Story"],
+        'summary': [story, " ".join(WORDS[100:140]), story],
+    }, index=[10, 11, 12])
+    enriched_ids = []
+
+    def enrich(stories):
+        enriched_ids.extend(stories['id'])
+        stories['sentiment'] = [0.5, -0.5]
+
+    enrich_stories(df, enrich)
+
+    assert enriched_ids == ["a", "b"]
+    assert df['sentiment'].tolist() == [0.5, -0.5, 0.5]
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+
+from entity_index import build_entity_index, encode_entities, entity_counts, entity_options, restrict_index, select_rows
+
+PEOPLE = pd.Series([["Alice", "Bob"], [], None, ["Bob", "Bob"], ["Alice"]])
+
+
+def test_encode_entities_keeps_row_order_and_empty_rows():
+    column = encode_entities(PEOPLE)
+
+    assert len(column) == 5
+    assert column.rows(range(5)) == [["Alice", "Bob"], [], [], ["Bob", "Bob"], ["Alice"]]
+
+
+def test_build_entity_index_lists_each_row_once():
+    index = build_entity_index(PEOPLE)
+
+    assert {name: positions.tolist() for name, positions in index.items()} == {'Alice': [0, 4], 'Bob': [0, 3]}
+    assert entity_counts(index) == {'Alice': 2, 'Bob': 2}
+    assert build_entity_index(pd.Series([[], None])) == {}
+
+
+def test_select_rows_intersects_columns():
+    organizations = pd.Series([["Acme"], ["Acme"], [], [], ["Initech"]])
+    indexes = {'people': build_entity_index(PEOPLE), 'organizations': build_entity_index(organizations)}
+
+    assert select_rows(indexes, {'people': [], 'organizations': []}) is None
+    assert select_rows(indexes, {'people': ["Alice", "Bob"], 'organizations': ["Acme", "Initech"]}).tolist() == [0, 4]
+    assert np.array_equal(select_rows(indexes, {'people': ["Bob"], 'organizations': ["Initech"]}), [])
+
+
+def test_restrict_index_to_a_time_window():
+    index = restrict_index(build_entity_index(PEOPLE), 1, 4)
+
+    assert {name: positions.tolist() for name, positions in index.items()} == {'Bob': [3]}
+    assert entity_options(index) == ["Bob"]
+    assert restrict_index(build_entity_index(PEOPLE), 5, 5) == {}
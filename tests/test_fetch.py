@@ -0,0 +1,184 @@
+import io
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+import pytest
+import requests
+
+import fetch
+import store
+from fetch import filter_articles_by_time, localise_london
+
+
+def make_articles(times):
+    return pd.DataFrame({
+        'id': [str(i) for i in range(len(times))],
+        'timestamp': pd.to_datetime(times, utc=True),
+    })
+
+
+def test_localise_london_ambiguous_time_is_taken_as_gmt():
+    # 01:30 happens twice on 2026-10-25 when the clocks go back; the later (GMT) one is used
+    assert localise_london(datetime(2026, 10, 25, 1, 30)) == pd.Timestamp("2026-10-25 01:30", tz="UTC")
+
+
+def test_localise_london_nonexistent_time_shifts_forward():
+    # 01:30 is skipped on 2026-03-29 when the clocks go forward; it moves to 02:00 BST (01:00 UTC)
+    assert localise_london(datetime(2026, 3, 29, 1, 30)) == pd.Timestamp("2026-03-29 01:00", tz="UTC")
+
+
+def test_localise_london_keeps_aware_times():
+    timestamp = pd.Timestamp("2026-10-25 01:30", tz="UTC")
+    assert localise_london(timestamp) is timestamp
+
+
+def test_filter_articles_by_time_at_clocks_going_back():
+    df = make_articles(["2026-10-25T00:15:00Z", "2026-10-25T00:45:00Z", "2026-10-25T01:45:00Z"])
+    filtered = filter_articles_by_time(df, datetime(2026, 10, 25, 1, 30))
+    assert filtered['id'].tolist() == ["2"]
+
+
+def test_filter_articles_by_time_at_clocks_going_forward():
+    df = make_articles(["2026-03-29T00:45:00Z", "2026-03-29T01:15:00Z"])
+    filtered = filter_articles_by_time(df, datetime(2026, 3, 29, 1, 30))
+    assert filtered['id'].tolist() == ["1"]
+
+
+def test_concurrent_refreshes_share_one_call_with_the_query_as_typed(monkeypatch):
+    calls = []
+    release = threading.Event()
+
+    def slow_fetch(query_text, result_size):
+        calls.append(query_text)
+        release.wait(5)
+        return make_articles(["2026-10-01T09:00:00Z"])
+
+    monkeypatch.setattr(fetch, "fetch_and_process_data", slow_fetch)
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        futures = [executor.submit(fetch.refresh_query, query_text, 10) for query_text in ("Cake Recipes", "cake  recipes", "CAKE RECIPES")]
+        # Give every caller time to join the call in flight before the API answers
+        time.sleep(0.2)
+        release.set()
+        frames = [future.result() for future in futures]
+
+    assert calls == ["Cake Recipes"]
+    assert all(frame['query_text'].tolist() == ["cake recipes"] for frame in frames)
+    assert frames[0] is not frames[1]
+    assert store.latest_articles("cake recipes", 10)['id'].tolist() == ["0"]
+
+
+def test_non_retryable_errors_leave_a_half_open_breaker_open(monkeypatch):
+    breaker = fetch.CircuitBreaker(failure_threshold=1, reset_seconds=0)
+    breaker.record_failure()
+    monkeypatch.setattr(fetch, "breaker", breaker)
+
+    response = requests.Response()
+    response.status_code = 404
+    response.raw = io.BytesIO(b"")
+    monkeypatch.setattr(fetch.session, "post", lambda *args, **kwargs: response)
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        fetch.post_to_api({})
+
+    # The trial slot is free again, but the circuit hasn't been closed by the failed trial
+    assert breaker.allow()
+    assert breaker._opened_at is not None
+
+
+def test_partial_stale_results_wait_for_the_api(monkeypatch):
+    stored = make_articles(["2026-10-01T09:00:00Z"])
+    store.upsert_articles("cake recipes", stored)
+    store.mark_fetched("cake recipes", fetched_at=0)
+
+    monkeypatch.setattr(fetch, "fetch_and_process_data", lambda query_text, result_size: make_articles(["2026-10-01T09:00:00Z", "2026-10-01T10:00:00Z"]))
+    assert len(fetch.fetch_or_retrieve_cached_data("cake recipes", 2)) == 2
+
+    # Once fetched recently, whatever the API returned is served from the store
+    monkeypatch.setattr(fetch, "fetch_and_process_data", lambda query_text, result_size: 1 / 0)
+    assert len(fetch.fetch_or_retrieve_cached_data("cake recipes", 5)) == 2
+
+
+def test_partial_stale_results_are_served_when_the_api_fails(monkeypatch):
+    store.upsert_articles("cake recipes", make_articles(["2026-10-01T09:00:00Z"]))
+    monkeypatch.setattr(fetch, "fetch_and_process_data", lambda query_text, result_size: pd.DataFrame({'message': ["API down"]}))
+
+    assert fetch.fetch_or_retrieve_cached_data("cake recipes", 2)['id'].tolist() == ["0"]
+
+
+def split_body(body, size):
+    return [body[start:start + size] for start in range(0, len(body), size)]
+
+
+class StreamedResponse:
+    # Stands in for a streamed requests.Response, handing the body over a few characters at a time
+    encoding = "utf-8"
+
+    def __init__(self, body, size=7):
+        self.body = body
+        self.size = size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def iter_content(self, chunk_size, decode_unicode):
+        return iter(split_body(self.body, self.size))
+
+
+ARTICLES = [{'id': f"a{i}", 'title': f"Story {i}, with [brackets] and \"quotes\"", 'score': i / 10} for i in range(5)]
+
+
+def test_iter_json_results_parses_articles_split_across_chunks():
+    body = json.dumps({'results': ARTICLES, 'total': 5})
+
+    # Chunks of 7 characters end part way through most articles
+    assert list(fetch.iter_json_results(split_body(body, 7))) == ARTICLES
+
+
+def test_iter_json_results_with_empty_results():
+    assert list(fetch.iter_json_results(split_body('{"results": [ ]}', 3))) == []
+
+
+def test_iter_json_results_without_results_key():
+    with pytest.raises(KeyError):
+        list(fetch.iter_json_results(split_body('{"message": "no results"}', 4)))
+
+
+def test_iter_json_results_with_truncated_stream():
+    body = json.dumps({'results': ARTICLES})
+    parsed = []
+
+    with pytest.raises(json.JSONDecodeError):
+        for article in fetch.iter_json_results(split_body(body[:-30], 7)):
+            parsed.append(article)
+
+    # Every article that arrived whole was yielded before the error
+    assert parsed == ARTICLES[:4]
+
+
+def test_iter_fetch_and_process_data_yields_chunks(monkeypatch):
+    body = json.dumps({'results': ARTICLES})
+    monkeypatch.setattr(fetch, "post_to_api", lambda payload, timeout, stream: StreamedResponse(body))
+
+    frames = list(fetch.iter_fetch_and_process_data("cake recipes", 5, chunk_size=2))
+
+    assert [frame['id'].tolist() for frame in frames] == [["a0", "a1"], ["a2", "a3"], ["a4"]]
+
+
+@pytest.mark.parametrize("body, message", [
+    ('{"message": "no results"}', "'results' key not found"),
+    (json.dumps({'results': ARTICLES})[:-30], "Could not decode JSON"),
+])
+def test_iter_fetch_and_process_data_ends_with_a_message(monkeypatch, body, message):
+    monkeypatch.setattr(fetch, "post_to_api", lambda payload, timeout, stream: StreamedResponse(body))
+
+    frames = list(fetch.iter_fetch_and_process_data("cake recipes", 5, chunk_size=2))
+
+    assert message in frames[-1]['message'][0]
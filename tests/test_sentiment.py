@@ -0,0 +1,77 @@
+import pandas as pd
+import spacy
+from spacy.tokens import Span
+
+import sentiment
+from sentiment import Gazetteer
+
+
+def model_doc(nlp, text, entities=()):
+    # A document as the statistical model would return it, with the given (start, end, label) entities
+    doc = nlp.make_doc(text)
+    doc.ents = [Span(doc, start, end, label=label) for start, end, label in entities]
+    return doc
+
+
+def test_gazetteer_only_trusts_non_names_after_repeated_sightings():
+    nlp = spacy.blank("en")
+    gazetteer = Gazetteer(nlp)
+    text = "Mary Jones praised Apple"
+    gazetteer.add("Apple", "ORG")
+
+    # The model missing a name once doesn't hide it from the model next time
+    gazetteer.learn(model_doc(nlp, text))
+    assert gazetteer.match(text)[1]
+
+    for _ in range(sentiment.NON_ENTITY_MIN_SIGHTINGS - 1):
+        gazetteer.learn(model_doc(nlp, text))
+    assert not gazetteer.match(text)[1]
+
+    # Once found as a name, its words stop counting as non-names
+    gazetteer.learn(model_doc(nlp, text, [(0, 2, "PERSON")]))
+    entities, unknown = gazetteer.match(text)
+    assert not unknown
+    assert entities == {'people': ["Mary Jones"], 'organizations': ["Apple"]}
+
+
+def test_gazetteer_non_names_expire_and_are_bounded(monkeypatch):
+    nlp = spacy.blank("en")
+    gazetteer = Gazetteer(nlp)
+    monkeypatch.setattr(sentiment, "NON_ENTITY_MIN_SIGHTINGS", 1)
+    monkeypatch.setattr(sentiment, "NON_ENTITY_MAX_WORDS", 2)
+
+    gazetteer.learn(model_doc(nlp, "Officials Said Today"))
+    assert list(gazetteer.non_entity_words) == ["Said", "Today"]
+    assert not gazetteer.match("Today")[1]
+
+    monkeypatch.setattr(sentiment, "NON_ENTITY_TTL_SECONDS", 0)
+    assert gazetteer.match("Today")[1]
+
+
+def test_cached_entities_are_only_reused_by_modes_no_more_thorough(monkeypatch):
+    modes = []
+
+    def fake_extract(texts, batch_size, n_process, mode):
+        modes.append(mode)
+        return [[mode] for _ in texts], [[] for _ in texts]
+
+    monkeypatch.setattr(sentiment, "extract_entities_batch", fake_extract)
+    monkeypatch.setattr(sentiment, "score_texts", lambda texts: [0.0] * len(texts))
+    df = pd.DataFrame({'id': ["a1"], 'title': ["Title"], 'summary': ["Summary."]})
+
+    sentiment.package_articles_with_sentiment_info(df.copy(), ner_mode="fast")
+    sentiment.package_articles_with_sentiment_info(df.copy(), ner_mode="fast")
+    accurate_df = df.copy()
+    sentiment.package_articles_with_sentiment_info(accurate_df, ner_mode="accurate")
+    balanced_df = df.copy()
+    sentiment.package_articles_with_sentiment_info(balanced_df, ner_mode="balanced")
+
+    assert modes == ["fast", "accurate"]
+    assert balanced_df['people'].tolist() == [["accurate"]]
+
+
+def test_sentiment_categories_match_sentiment_category_at_the_boundaries():
+    scores = [-1.0, -0.6, -0.5999, -0.2001, -0.2, 0.0, 0.2, 0.2001, 0.5999, 0.6, 1.0]
+
+    assert sentiment.sentiment_categories(scores).tolist() == [sentiment.sentiment_category(score) for score in scores]
+    assert sentiment.sentiment_categories([-0.6, -0.2, 0.2, 0.6]).tolist() == [-2, 0, 0, 2]
@@ -0,0 +1,74 @@
+from contextlib import closing
+
+import pandas as pd
+import pytest
+
+import store
+
+
+def test_schema_is_set_up_once_per_database(tmp_path, monkeypatch):
+    path = str(tmp_path / "once.db")
+    store.connect(path).close()
+
+    def set_up_again(connection):
+        raise AssertionError("schema set up again")
+
+    monkeypatch.setattr(store, "_set_up", set_up_again)
+    with closing(store.connect(path)) as connection:
+        assert connection.execute("PRAGMA user_version").fetchone()[0] == store.SCHEMA_VERSION
+
+
+def test_stored_articles_are_searchable():
+    store.upsert_articles("baking", pd.DataFrame({
+        'id': ["a1", "a2"],
+        'title': ["Lemon drizzle cake", "Bread"],
+        'summary': ["", "A lemon loaf."],
+        'timestamp': ["2026-10-01T09:00:00Z", "2026-10-01T10:00:00Z"],
+    }))
+
+    # Title matches rank above summary matches
+    assert store.search_articles("lemon", 10)['id'].tolist() == ["a1", "a2"]
+    assert store.search_articles("lemon cake", 10)['id'].tolist() == ["a1"]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # A settable time.time for the frame cache
+    now = [1_000.0]
+    monkeypatch.setattr(store.time, "time", lambda: now[0])
+    return now
+
+
+def frame_size():
+    with closing(store.connect()) as connection:
+        return connection.execute("SELECT MAX(size_bytes) FROM frames").fetchone()[0]
+
+
+def test_frames_expire_after_their_ttl(clock):
+    frame = pd.DataFrame({'id': ["a1", "a2"], 'score': [0.9, 0.8]})
+    assert store.put_frame("recent", frame, ttl=60)
+
+    clock[0] += 59
+    pd.testing.assert_frame_equal(store.get_frame("recent"), frame)
+
+    clock[0] += 1
+    assert store.get_frame("recent") is None
+
+
+def test_least_recently_used_frames_are_evicted_over_the_size_budget(clock):
+    frame = pd.DataFrame({'id': ["a1", "a2"], 'score': [0.9, 0.8]})
+    store.put_frame("first", frame, ttl=60)
+    budget = 2 * frame_size()
+
+    clock[0] += 1
+    store.put_frame("second", frame, ttl=60, max_bytes=budget)
+    clock[0] += 1
+    store.get_frame("first")
+
+    # Only two frames fit, and "second" is the one read longest ago
+    clock[0] += 1
+    store.put_frame("third", frame, ttl=60, max_bytes=budget)
+
+    assert store.get_frame("first") is not None
+    assert store.get_frame("second") is None
+    assert store.get_frame("third") is not None